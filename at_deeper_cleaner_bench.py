@@ -0,0 +1,277 @@
+"""Benchmark del motore di pulizia di Deeper Cleaner.
+
+Genera CSV Deeper sintetici (deterministici a parita' di parametri), li pulisce
+con at_deeper_cleaner_core nelle diverse modalita' e registra righe/s, MB/s,
+picco di memoria (RSS) e dimensione dell'output in un file JSON, che puo'
+essere confrontato con quello di una versione precedente. La modalita'
+``baseline`` esegue il ciclo originale della GUI (csv.reader/csv.writer riga
+per riga) e le altre vengono riportate anche come multipli della sua velocita':
+
+    python at_deeper_cleaner_bench.py --sizes 1e4 1e5 1e6 --output new.json
+    python at_deeper_cleaner_bench.py --sizes 1e4 1e5 1e6 --compare old.json
+
+Ogni misura gira in un processo separato, cosi' il picco di memoria e'
+quello della sola pulizia. I file generati restano in ``--data-dir`` e
+vengono riutilizzati.
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: picco di memoria non disponibile
+    resource = None
+
+from at_deeper_cleaner_core import COLUMNAR_AVAILABLE, HEADER, clean_file, is_valid
+
+DEFAULT_SIZES = [10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8]
+# Opzioni di clean_file ed estensione dell'output per ogni modalita'
+# (None: il ciclo originale di clean_data_baseline al posto di clean_file)
+MODES = {
+    "baseline": (None, ".csv"),
+    "row": ({}, ".csv"),
+    "columnar": ({"columnar": True}, ".csv"),
+    "npy": ({"columnar": True}, ".npy"),
+    "filter": ({"columnar": True, "filter_records": True}, ".csv"),
+    "grid": ({"columnar": True, "grid_size": 2.0}, ".csv"),
+}
+GENERATE_BATCH = 100000
+
+
+def synthetic_rows(rows, invalid_ratio=0.1, malformed_ratio=0.01, seed=0):
+    """Righe di un log Deeper sintetico, sempre le stesse a parita' di parametri.
+
+    Il percorso e' una passeggiata casuale su un lago con profondita' che
+    varia lentamente. Una frazione ``invalid_ratio`` di righe ha coordinate
+    assenti o nulle (GPS non agganciato), una frazione ``malformed_ratio``
+    e' troncata o ha campi non numerici.
+    """
+    rnd = random.Random(seed)
+    lat, lon, depth = 46.0, 11.0, 10.0
+    timestamp = 1700000000000
+    for _ in range(rows):
+        lat += rnd.gauss(0, 2e-6)
+        lon += rnd.gauss(0, 2e-6)
+        depth = min(max(depth + rnd.gauss(0, 0.05), 0.3), 80.0)
+        timestamp += 100
+        line = f"{lat:.6f},{lon:.6f},{depth:.2f},{timestamp},{rnd.uniform(4, 24):.1f}"
+        draw = rnd.random()
+        if draw < invalid_ratio:
+            line = rnd.choice([f",,{depth:.2f},{timestamp},12.0", f"0.0,0.0,{depth:.2f},{timestamp},12.0"])
+        elif draw < invalid_ratio + malformed_ratio:
+            line = rnd.choice([line[:rnd.randint(0, len(line))], f"{lat:.6f},{lon:.6f},n/a,{timestamp},",
+                               "#### log error ####", f"{lat:.6f};{lon:.6f};{depth:.2f}"])
+        yield line
+
+
+def generate_csv(path, rows, invalid_ratio=0.1, malformed_ratio=0.01, seed=0):
+    """Scrive in ``path`` un CSV Deeper sintetico di ``rows`` righe (intestazione esclusa)."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    lines = synthetic_rows(rows, invalid_ratio, malformed_ratio, seed)
+    with open(tmp_path, "w", encoding="utf-8", newline="") as outfile:
+        outfile.write(",".join(HEADER[:5]) + "\n")
+        while True:
+            batch = [line for _, line in zip(range(GENERATE_BATCH), lines)]
+            if not batch:
+                break
+            outfile.write("\n".join(batch) + "\n")
+    os.replace(tmp_path, path)
+
+
+def dataset_path(data_dir, rows, invalid_ratio, malformed_ratio, seed):
+    """File generato (e riutilizzato) per una combinazione di parametri."""
+    name = f"deeper_{rows}_inv{invalid_ratio:g}_mal{malformed_ratio:g}_seed{seed}.csv"
+    path = os.path.join(data_dir, name)
+    if not os.path.exists(path):
+        generate_csv(path, rows, invalid_ratio, malformed_ratio, seed)
+    return path
+
+
+def clean_data_baseline(input_path, output_path, surface_alt=0.0):
+    """Il ciclo di pulizia originale (clean_data di at_deeper_cleaner_v03.py), come riferimento.
+
+    Restituisce le stesse statistiche di clean_file; le righe scritte si
+    contano rileggendo l'output, fuori dal tempo misurato.
+    """
+    start = time.perf_counter()
+    with open(input_path, newline="") as infile, open(output_path, "w", newline="") as outfile:
+        reader = csv.reader(infile)
+        writer = csv.writer(outfile)
+        writer.writerow(HEADER)
+
+        for row in reader:
+            row = [item.strip() for item in row]
+            if is_valid(row):
+                try:
+                    depth = float(row[2])
+                    alt_asl = surface_alt - depth
+                    row.append(f"{alt_asl:.2f}")
+                    writer.writerow(row)
+                except ValueError:
+                    continue
+        rows_read = reader.line_num
+    elapsed = time.perf_counter() - start
+    with open(output_path, newline="") as outfile:
+        rows_written = sum(1 for _ in csv.reader(outfile)) - 1
+    size = os.path.getsize(input_path)
+    return {"rows_read": rows_read, "rows_written": rows_written, "bytes_read": size, "bytes_total": size,
+            "elapsed": elapsed}
+
+
+def peak_rss():
+    """Picco di memoria residente del processo in bytes, None se non disponibile."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux: KB
+
+
+def measure(input_path, output_path, mode):
+    """Pulisce ``input_path`` nella modalita' ``mode`` e restituisce le misure."""
+    options, _ = MODES[mode]
+    if options is None:
+        stats = clean_data_baseline(input_path, output_path)
+    else:
+        stats = clean_file(input_path, output_path, **options)
+    elapsed = max(stats["elapsed"], 1e-9)
+    return {
+        "seconds": stats["elapsed"],
+        "rows_read": stats["rows_read"],
+        "rows_written": stats["rows_written"],
+        "rows_per_s": stats["rows_read"] / elapsed,
+        "mb_per_s": stats["bytes_read"] / 1e6 / elapsed,
+        "input_bytes": stats["bytes_total"],
+        "output_bytes": os.path.getsize(output_path),
+        "peak_rss": peak_rss(),
+    }
+
+
+def run_isolated(input_path, output_path, mode):
+    """Esegue ``measure`` in un nuovo interprete e ne legge il risultato JSON."""
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--measure", input_path, output_path, mode],
+        check=True, stdout=subprocess.PIPE, text=True)
+    return json.loads(result.stdout)
+
+
+def run_suite(sizes, modes, data_dir, invalid_ratio=0.1, malformed_ratio=0.01, seed=0, repeat=1,
+              log=None):
+    """Misura ogni modalita' su ogni dimensione; tiene la ripetizione piu' veloce."""
+    results = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for rows in sizes:
+            input_path = dataset_path(data_dir, rows, invalid_ratio, malformed_ratio, seed)
+            for mode in modes:
+                output_path = os.path.join(out_dir, f"out_{mode}{MODES[mode][1]}")
+                runs = [run_isolated(input_path, output_path, mode) for _ in range(repeat)]
+                best = min(runs, key=lambda run: run["seconds"])
+                best.update(rows=rows, mode=mode)
+                results.append(best)
+                os.remove(output_path)
+                if log:
+                    log(format_result(best))
+    return results
+
+
+def format_result(result):
+    rss = f"{result['peak_rss'] / 1e6:.0f} MB" if result["peak_rss"] is not None else "n/a"
+    return (f"{result['mode']:>9} {result['rows']:>11} rows: {result['seconds']:8.2f} s "
+            f"{result['rows_per_s']:>11.0f} rows/s {result['mb_per_s']:7.1f} MB/s "
+            f"peak RSS {rss:>7}, output {result['output_bytes'] / 1e6:.1f} MB")
+
+
+def against_baseline(results):
+    """Righe con la velocita' di ogni modalita' rispetto al ciclo originale (modalita' baseline)."""
+    reference = {item["rows"]: item for item in results if item["mode"] == "baseline"}
+    lines = []
+    for result in results:
+        base = reference.get(result["rows"])
+        if base is None or result is base:
+            continue
+        lines.append(f"{result['mode']:>9} {result['rows']:>11} rows: "
+                     f"{result['rows_per_s'] / base['rows_per_s']:.2f}x the original loop "
+                     f"({base['seconds']:.2f} s -> {result['seconds']:.2f} s)")
+    return lines
+
+
+def compare(results, baseline):
+    """Righe di confronto (rapporto di velocita') con i risultati di ``baseline``."""
+    previous = {(item["mode"], item["rows"]): item for item in baseline["results"]}
+    lines = []
+    for result in results:
+        old = previous.get((result["mode"], result["rows"]))
+        if old is None:
+            continue
+        lines.append(f"{result['mode']:>9} {result['rows']:>11} rows: "
+                     f"{result['rows_per_s'] / old['rows_per_s']:.2f}x speed "
+                     f"({old['rows_per_s']:.0f} -> {result['rows_per_s']:.0f} rows/s)")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Deeper Cleaner engine (Arc-Team Tools).")
+    parser.add_argument("--sizes", type=float, nargs="+", default=DEFAULT_SIZES, metavar="ROWS",
+                        help="row counts to benchmark (default: 1e4 1e5 1e6 1e7 1e8)")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), metavar="MODE",
+                        default=["baseline", "row", "columnar"] if COLUMNAR_AVAILABLE else ["baseline", "row"],
+                        help=f"cleaning modes: {', '.join(MODES)} (default: baseline row columnar)")
+    parser.add_argument("--invalid-ratio", type=float, default=0.1,
+                        help="fraction of rows without coordinates (default: 0.1)")
+    parser.add_argument("--malformed-ratio", type=float, default=0.01,
+                        help="fraction of truncated or non-numeric rows (default: 0.01)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the generator (default: 0)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per measure, the fastest is kept")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "deeper_bench"),
+                        help="where generated CSV files are kept and reused")
+    parser.add_argument("--output", metavar="JSON", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="JSON", help="compare with the results of a previous run")
+    parser.add_argument("--generate", metavar="CSV",
+                        help="only write a synthetic CSV of the first --sizes row count and exit")
+    parser.add_argument("--measure", nargs=3, metavar=("INPUT", "OUTPUT", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        print(json.dumps(measure(*args.measure)))
+        return 0
+    sizes = [int(size) for size in args.sizes]
+    if args.generate:
+        generate_csv(args.generate, sizes[0], args.invalid_ratio, args.malformed_ratio, args.seed)
+        return 0
+    if any(mode not in ("baseline", "row") for mode in args.modes) and not COLUMNAR_AVAILABLE:
+        parser.error("modes other than 'baseline' and 'row' require NumPy")
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = run_suite(sizes, args.modes, args.data_dir, args.invalid_ratio, args.malformed_ratio,
+                        args.seed, args.repeat, log=print)
+    for line in against_baseline(results):
+        print(line)
+    report = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "generator": {"invalid_ratio": args.invalid_ratio, "malformed_ratio": args.malformed_ratio,
+                      "seed": args.seed},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as outfile:
+            json.dump(report, outfile, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as infile:
+            for line in compare(results, json.load(infile)):
+                print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
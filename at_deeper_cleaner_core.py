@@ -0,0 +1,1239 @@
+"""Motore di pulizia di Deeper Cleaner, utilizzabile senza interfaccia grafica.
+
+Legge il CSV esportato dal sonar Deeper a blocchi di grandi dimensioni, scarta
+le righe senza latitudine/longitudine e aggiunge la colonna ``altitude_asl``
+(quota superficie - profondita'). La memoria usata e' costante, per cui si
+possono pulire anche log di diversi GB, ad esempio su un server via SSH:
+
+    python at_deeper_cleaner_core.py input.csv output.csv --surface-alt 195.5
+"""
+import argparse
+import contextlib
+import csv
+import hashlib
+import io
+import itertools
+import json
+import locale
+import math
+import multiprocessing
+import os
+import shutil
+import struct
+import sys
+import time
+from bisect import bisect_left, insort
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from operator import itemgetter
+
+try:
+    import numpy as np
+except ImportError:  # NumPy serve solo per la modalita' colonnare
+    np = None
+
+COLUMNAR_AVAILABLE = np is not None
+
+HEADER = ["latitude", "longitude", "depth", "timestamp", "temperature", "altitude_asl"]
+GRID_HEADER = ["latitude", "longitude", "count", "depth_mean", "depth_min", "depth_max",
+               "altitude_asl_mean", "altitude_asl_min", "altitude_asl_max"]
+
+# Formato binario (.npy, leggibile con numpy.load(path, mmap_mode="r")):
+# coordinate e timestamp in float64, le altre misure in float32
+NPY_DTYPE = [("latitude", "<f8"), ("longitude", "<f8"), ("depth", "<f4"), ("timestamp", "<f8"),
+             ("temperature", "<f4"), ("altitude_asl", "<f4")]
+GRID_NPY_DTYPE = [("latitude", "<f8"), ("longitude", "<f8"), ("count", "<u4")] + \
+    [(name, "<f4") for name in GRID_HEADER[3:]]
+# Intestazione .npy a lunghezza fissa, riscritta con il numero di righe a fine lavoro
+NPY_HEADER_SIZE = 512
+
+# Pulizia incrementale: versione del file .state e bytes usati per l'impronta
+STATE_VERSION = 1
+FINGERPRINT_SIZE = 64 * 1024
+
+# Dimensione dei blocchi letti dal file di input e del buffer di scrittura
+CHUNK_SIZE = 4 * 1024 * 1024
+BUFFER_SIZE = 1024 * 1024
+# Intervallo (secondi) con cui clean_folder controlla l'annullamento
+CANCEL_POLL = 0.2
+
+# Filtro di duplicati e picchi (RecordFilter): numero di record precedenti
+# confrontati, finestra della mediana mobile, soglia in MAD e scarto minimo
+DUPLICATE_WINDOW = 8
+SPIKE_WINDOW = 15
+SPIKE_FACTOR = 5.0
+MIN_SPIKE = 1.0
+
+
+class CleaningCancelled(Exception):
+    """Sollevata quando la pulizia viene interrotta dall'utente."""
+
+
+def is_valid(row):
+    if len(row) < 5:  # Modificato a < 5 per sicurezza
+        return False
+    try:
+        lat, lon = float(row[0]), float(row[1])
+        return lat != 0.0 and lon != 0.0
+    except ValueError:
+        return False
+
+
+def read_blocks(infile, chunk_size=CHUNK_SIZE):
+    """Legge un file binario a blocchi che terminano sempre a fine riga.
+
+    Restituisce coppie (offset di fine blocco, bytes del blocco).
+    """
+    offset = infile.tell()
+    pending = b""
+    while True:
+        data = infile.read(chunk_size)
+        if not data:
+            break
+        data = pending + data
+        cut = data.rfind(b"\n") + 1
+        if cut == 0:
+            # Nessun fine riga nel blocco: si continua ad accumulare
+            pending = data
+            continue
+        pending = data[cut:]
+        offset += cut
+        yield offset, data[:cut]
+    if pending:
+        offset += len(pending)
+        yield offset, pending
+
+
+def parse_rows(block, encoding=None):
+    """Converte un blocco di bytes nelle righe del CSV (liste di stringhe)."""
+    text = block.decode(encoding or locale.getpreferredencoding(False))
+    return csv.reader(io.StringIO(text, newline=""))
+
+
+def clean_rows(rows, surface_alt=0.0):
+    """Filtra le righe valide e aggiunge la quota sul livello del mare."""
+    strip = str.strip
+    for row in rows:
+        # Stessi controlli di is_valid, in linea: e' il ciclo eseguito per ogni riga
+        if len(row) < 5:
+            continue
+        row = list(map(strip, row))
+        try:
+            lat, lon, depth = float(row[0]), float(row[1]), float(row[2])
+        except ValueError:
+            continue  # Salta righe con coordinate o depth non numeriche
+        if lat != 0.0 and lon != 0.0:
+            # Calcolo: Quota Superficie - Profondità
+            row.append(f"{surface_alt - depth:.2f}")
+            yield row
+
+
+class RecordFilter:
+    """Scarta i ping ripetuti e i picchi di profondita' di un flusso di record.
+
+    Un record e' un duplicato se posizione e profondita' coincidono con uno
+    dei ``duplicate_window`` record precedenti. Gli altri vengono confrontati
+    con la mediana delle ultime ``spike_window`` profondita': se lo scarto
+    supera sia ``spike_factor`` volte la MAD (mediana degli scarti assoluti)
+    sia ``min_spike`` metri il record e' un picco. Anche i picchi entrano
+    nella finestra, cosi' un vero gradino del fondale viene accettato dopo
+    meta' finestra. Lo stato e' limitato alle due finestre e si conserva
+    tra un blocco e l'altro; ``accept`` e ``mask`` (NumPy) danno lo stesso
+    risultato.
+    """
+
+    def __init__(self, duplicate_window=DUPLICATE_WINDOW, spike_window=SPIKE_WINDOW,
+                 spike_factor=SPIKE_FACTOR, min_spike=MIN_SPIKE):
+        if duplicate_window < 1 or spike_window < 1:
+            raise ValueError("Filter windows must contain at least one record.")
+        self.duplicate_window = duplicate_window
+        self.spike_window = spike_window
+        self.spike_factor = spike_factor
+        self.min_spike = min_spike
+        self.keys = deque()
+        self.key_counts = {}
+        self.depths = deque()
+        self.sorted_depths = []
+        self.duplicates = 0
+        self.spikes = 0
+
+    def _push_key(self, key):
+        self.keys.append(key)
+        self.key_counts[key] = self.key_counts.get(key, 0) + 1
+        if len(self.keys) > self.duplicate_window:
+            old = self.keys.popleft()
+            self.key_counts[old] -= 1
+            if not self.key_counts[old]:
+                del self.key_counts[old]
+
+    def _push_depth(self, depth):
+        self.depths.append(depth)
+        insort(self.sorted_depths, depth)
+        if len(self.depths) > self.spike_window:
+            del self.sorted_depths[bisect_left(self.sorted_depths, self.depths.popleft())]
+
+    def accept(self, lat, lon, depth):
+        """True se il record va tenuto; aggiorna le finestre."""
+        key = (lat, lon, depth)
+        # NaN non e' mai uguale a se stesso (come nel confronto di ``mask``)
+        duplicate = key in self.key_counts and not any(map(math.isnan, key))
+        self._push_key(key)
+        if duplicate:
+            self.duplicates += 1
+            return False
+        if not math.isfinite(depth):
+            return True  # Fuori dalla finestra: non si confronta con la mediana
+        spike = False
+        if len(self.depths) == self.spike_window:
+            middle = self.spike_window // 2
+            median = self.sorted_depths[middle]
+            deviation = abs(depth - median)
+            # La MAD serve solo per gli scarti oltre min_spike, cioe' quasi mai
+            spike = deviation > self.min_spike and \
+                deviation > self.spike_factor * sorted(abs(value - median) for value in self.sorted_depths)[middle]
+        self._push_depth(depth)
+        if spike:
+            self.spikes += 1
+        return not spike
+
+    def state(self):
+        """Contenuto delle finestre, serializzabile in JSON."""
+        return {"keys": [list(key) for key in self.keys], "depths": list(self.depths)}
+
+    def restore(self, state):
+        """Ripristina le finestre salvate con ``state`` (None: finestre vuote)."""
+        for key in (state or {}).get("keys", []):
+            self._push_key(tuple(key))
+        for depth in (state or {}).get("depths", []):
+            self._push_depth(depth)
+
+    def filter_rows(self, rows):
+        """Le righe pulite (liste di stringhe) accettate, nello stesso ordine."""
+        return [row for row in rows if self.accept(float(row[0]), float(row[1]), float(row[2]))]
+
+    def mask(self, lat, lon, depth):
+        """Versione vettoriale di ``accept`` su array NumPy; restituisce la maschera."""
+        count = len(depth)
+        kept = len(self.keys)
+        previous = np.array(list(self.keys), dtype=np.float64).reshape(-1, 3)
+        keys = np.concatenate([previous, np.column_stack([lat, lon, depth])])
+        duplicate = np.zeros(count, dtype=bool)
+        for lag in range(1, min(self.duplicate_window, kept + count - 1) + 1):
+            first = max(0, lag - kept)
+            current, older = keys[kept + first:], keys[kept + first - lag:kept + count - lag]
+            duplicate[first:] |= (current[:, 0] == older[:, 0]) & (current[:, 1] == older[:, 1]) & \
+                (current[:, 2] == older[:, 2])
+        # Le finestre si riempiono solo con gli ultimi record del blocco
+        for key in map(tuple, keys[kept + max(0, count - self.duplicate_window):].tolist()):
+            self._push_key(key)
+
+        candidates = np.flatnonzero(~duplicate & np.isfinite(depth))
+        spike = np.zeros(count, dtype=bool)
+        window = self.spike_window
+        history = len(self.depths)
+        sequence = np.concatenate([np.array(self.depths, dtype=np.float64), depth[candidates]])
+        tested = np.arange(max(history, window), len(sequence))
+        if tested.size:
+            windows = np.lib.stride_tricks.sliding_window_view(sequence[:-1], window)[tested - window]
+            middle = window // 2
+            median = np.partition(windows, middle, axis=1)[:, middle]
+            deviation = np.abs(sequence[tested] - median)
+            far = np.flatnonzero(deviation > self.min_spike)
+            mad = np.partition(np.abs(windows[far] - median[far, None]), middle, axis=1)[:, middle]
+            spike[candidates[tested[far] - history]] = deviation[far] > self.spike_factor * mad
+        for value in sequence[max(history, len(sequence) - window):].tolist():
+            self._push_depth(value)
+
+        self.duplicates += int(duplicate.sum())
+        self.spikes += int(spike.sum())
+        return ~(duplicate | spike)
+
+
+def _write_rows(rows):
+    """Serializza le righe come farebbe csv.writer su file."""
+    out = io.StringIO(newline="")
+    csv.writer(out).writerows(rows)
+    return out.getvalue()
+
+
+def write_clean_block(writer, block, surface_alt=0.0, encoding=None, record_filter=None):
+    """Pulisce un blocco di bytes e scrive le righe con ``writer`` (csv.writer).
+
+    Le righe passano in streaming dal lettore allo scrittore, senza liste
+    intermedie. Con ``record_filter`` (RecordFilter) vengono scartati anche
+    duplicati e picchi di profondita'. Restituisce le righe scritte.
+    """
+    rows = clean_rows(parse_rows(block, encoding), surface_alt)
+    if record_filter is not None:
+        rows = (row for row in rows if record_filter.accept(float(row[0]), float(row[1]), float(row[2])))
+    # zip avanza il contatore a ogni riga: il conteggio resta nel ciclo in C di writerows
+    counter = itertools.count()
+    writer.writerows(map(itemgetter(0), zip(rows, counter)))
+    return next(counter)
+
+
+def clean_block(block, surface_alt=0.0, encoding=None, record_filter=None):
+    """Pulisce un blocco di bytes; restituisce (bytes di output, righe scritte).
+
+    Con ``record_filter`` (RecordFilter) vengono scartati anche duplicati e
+    picchi di profondita'.
+    """
+    encoding = encoding or locale.getpreferredencoding(False)
+    out = io.StringIO(newline="")
+    count = write_clean_block(csv.writer(out), block, surface_alt, encoding, record_filter)
+    return out.getvalue().encode(encoding), count
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return float("nan")
+
+
+def _rows_to_columns(rows, surface_alt):
+    """Colonne numeriche (lat, lon, depth, timestamp, temperature, quota) delle righe pulite."""
+    values = [(float(row[0]), float(row[1]), float(row[2]), _to_float(row[3]), _to_float(row[4]),
+               surface_alt - float(row[2])) for row in rows]
+    return np.array(values, dtype=np.float64).reshape(-1, len(HEADER))
+
+
+_POW10 = 10 ** np.arange(19, dtype=np.int64) if np else None
+_POW10F = 10.0 ** np.arange(19) if np else None
+# Cifre decimali gestite senza errori di arrotondamento (mantissa < 2**53)
+_MAX_DIGITS = 15
+
+
+def _parse_decimals(buf, starts, ends, values=True):
+    """Converte in float64 i campi nella forma [+-]cifre[.cifre].
+
+    Mantissa intera e potenza di 10 sono esatte, per cui la divisione da'
+    lo stesso risultato di float(). I campi con altri caratteri (esponenti,
+    nan, spazi) o troppe cifre vengono convertiti singolarmente con float();
+    quelli vuoti o fatti solo di cifre, punti e segni mal disposti non sono
+    numerici senza bisogno di float(). I campi non numerici valgono NaN. Restituisce (valori, campo numerico); con
+    ``values=False`` la mantissa non viene calcolata e al posto dei valori
+    si ottiene la maschera dei campi diversi da zero, che basta per
+    latitudine e longitudine nell'output CSV.
+    """
+    count = len(starts)
+    lengths = ends - starts
+    width = min(int(lengths.max()), _MAX_DIGITS + 2) if count else 0
+    mantissa = np.zeros(count, dtype=np.int64)
+    decimals = np.zeros(count, dtype=np.int64)
+    bad = np.zeros(count, dtype=bool)
+    other = np.zeros(count, dtype=bool)
+    dots = np.zeros(count, dtype=bool)
+    nonzero = np.zeros(count, dtype=bool)
+    sign = np.zeros(count, dtype=bool)
+    index = starts.copy()
+    # Un carattere alla volta su tutti i campi (schema di Horner), solo con
+    # operazioni su uint8 e bool, senza np.where
+    for j in range(width):
+        inside = lengths > j
+        char = buf.take(index, mode="clip")
+        digit = char - np.uint8(48)
+        is_digit = (digit < 10) & inside
+        is_dot = (char == 46) & inside
+        is_sign = ((char == 45) | (char == 43)) & inside
+        other |= inside & ~(is_digit | is_dot | is_sign)
+        if j == 0:
+            sign = is_sign
+        else:
+            bad |= is_sign
+        bad |= is_dot & dots
+        nonzero |= is_digit & (digit != 0)
+        if values:
+            flags = is_digit.view(np.uint8)
+            np.multiply(mantissa, 1 + 9 * flags, out=mantissa, casting="unsafe")
+            np.add(mantissa, digit * flags, out=mantissa, casting="unsafe")
+            decimals += is_digit & dots
+        dots |= is_dot
+        index += 1
+    ndigits = lengths - dots - sign
+    simple = ~bad & ~other & (lengths <= width) & (ndigits > 0) & (ndigits <= _MAX_DIGITS)
+    if values:
+        result = mantissa / _POW10F[decimals]
+        np.negative(result, out=result, where=sign & (buf.take(starts, mode="clip") == 45))
+    else:
+        result = nonzero
+
+    ok = simple.copy()
+    if values:
+        result[~simple] = np.nan
+    # float() solo dove potrebbe ancora riuscire
+    for i in np.flatnonzero(~simple & (other | (lengths > width) | (ndigits > _MAX_DIGITS))):
+        try:
+            value, ok[i] = float(bytes(buf[starts[i]:ends[i]])), True
+        except ValueError:
+            value = np.nan
+        result[i] = value if values else value != 0.0
+    return result, ok
+
+
+# Le coppie di cifre da "00" a "99", come caratteri
+_DIGIT_PAIRS = np.array([[48 + i // 10, 48 + i % 10] for i in range(100)], dtype=np.uint8) if np else None
+
+
+def _format_altitudes(alt):
+    """Equivalente vettoriale di f",{alt:.2f}\\r\\n" per ogni valore.
+
+    Le colonne sono fisse (virgola, segno, cifre intere con zeri a sinistra,
+    punto, decimali, "\\r\\n"): quali tenere per ogni valore lo dice una
+    tabella. Restituisce la matrice dei caratteri, la tabella, la riga
+    della tabella per ogni valore e la maschera dei valori da formattare
+    con Python (non finiti, troppo grandi o vicini a un arrotondamento a
+    meta'), a cui spetta la riga 0, vuota.
+    """
+    negative = np.signbit(alt)
+    with np.errstate(invalid="ignore"):
+        scaled = np.abs(alt) * 100
+        frac = scaled - np.floor(scaled)
+        fallback = ~(np.abs(alt) < 1e13) | (np.abs(frac - 0.5) <= scaled * 1e-15 + 1e-9)
+        cents = np.where(fallback, 0, np.rint(scaled)).astype(np.int64)
+    units, cents = np.divmod(cents, 100)
+
+    # Solo le colonne per le cifre effettivamente presenti, a coppie
+    most = len(str(int(units.max()))) if len(alt) else 1
+    ndigits = np.ones(len(alt), dtype=np.intp)
+    for power in _POW10[1:most]:
+        ndigits += units >= power
+    pairs = (most + 1) // 2
+    width = 2 * pairs + 7
+    text = np.empty((len(alt), width), dtype=np.uint8)
+    text[:, 0] = 44
+    text[:, 1] = 45
+    for k in range(pairs):
+        column = width - 7 - 2 * k
+        if k < pairs - 1:
+            units, rest = np.divmod(units, 100)
+        else:
+            rest = units
+        text[:, column:column + 2] = _DIGIT_PAIRS[rest]
+    text[:, -5] = 46
+    text[:, -4:-2] = _DIGIT_PAIRS[cents]
+    text[:, -2] = 13
+    text[:, -1] = 10
+
+    # Riga 2 * cifre - 1 per i positivi, la successiva per i negativi
+    columns = np.arange(width)
+    digits = np.arange(1, most + 1).repeat(2)[:, None]
+    signs = np.tile([False, True], most)[:, None]
+    table = (columns >= width - 5 - digits) | (columns == 0) | ((columns == 1) & signs)
+    table = np.concatenate([np.zeros((1, width), dtype=bool), table])
+    rows = np.where(fallback, 0, 2 * ndigits - 1 + negative)
+    return text, table, rows, fallback
+
+
+# Righe piu' lunghe (molti campi in piu') passano da csv.reader
+_MAX_LINE = 255
+
+
+def _assemble(buf, starts, ends, text, text_columns, text_rows):
+    """Concatena, riga per riga, buf[start:end] e le colonne di text scelte da text_columns[text_row].
+
+    Le righe vengono copiate in una matrice a larghezza fissa, da cui una
+    maschera booleana scarta le colonne in piu'. Le righe della maschera
+    dipendono solo dalla lunghezza e da text_row, e si prendono da una
+    tabella.
+    """
+    lengths = ends - starts
+    width = int(lengths.max()) if len(starts) else 0
+    last = len(buf) - width  # ultimo inizio con width byte disponibili
+    matrix = np.empty((len(starts), width + text.shape[1]), dtype=np.uint8)
+    matrix[:, :width] = np.lib.stride_tricks.sliding_window_view(buf, width)[np.minimum(starts, last)]
+    # Le ultime righe del blocco da una copia con zeri in coda
+    tail = np.flatnonzero(starts > last)
+    if tail.size:
+        padded = np.concatenate([buf[last:], np.zeros(width, dtype=np.uint8)])
+        matrix[tail, :width] = np.lib.stride_tricks.sliding_window_view(padded, width)[starts[tail] - last]
+    matrix[:, width:] = text
+    shape = (width + 1, len(text_columns))
+    table = np.concatenate([np.broadcast_to(np.arange(width) < np.arange(width + 1)[:, None, None], shape + (width,)),
+                            np.broadcast_to(text_columns, shape + text_columns.shape[1:])], axis=2)
+    keep = table.reshape(-1, matrix.shape[1])[lengths * len(text_columns) + text_rows]
+    return matrix[keep]
+
+
+def clean_block_columnar(block, surface_alt=0.0, encoding=None, columns=False, record_filter=None):
+    """Versione vettoriale di clean_block, con lo stesso output byte per byte.
+
+    Le righe particolari (virgolette, spazi, caratteri di controllo o non
+    ASCII, righe molto lunghe) vengono passate a clean_rows. Restituisce
+    (bytes di output, righe scritte, tabella); con ``columns=True`` la
+    tabella e' la matrice float64 delle righe pulite (colonne di HEADER),
+    altrimenti None.
+    """
+    encoding = encoding or locale.getpreferredencoding(False)
+    buf = np.frombuffer(block, dtype=np.uint8)
+    # Una sola passata sul blocco: posizioni e valori dei byte diversi da
+    # "-./0123456789", cioe' virgole, a capo, spazi, lettere...
+    marks = np.flatnonzero((buf < 45) | (buf > 57))
+    kinds = buf[marks]
+    if not len(buf) or (kinds == 34).any():
+        # Le virgolette possono racchiudere virgole e a capo: serve csv.reader
+        rows = list(clean_rows(parse_rows(block, encoding), surface_alt))
+        if record_filter is not None:
+            rows = record_filter.filter_rows(rows)
+        return (_write_rows(rows).encode(encoding), len(rows),
+                _rows_to_columns(rows, surface_alt) if columns else None)
+
+    n = len(buf)
+    newlines = np.flatnonzero(kinds == 10)
+    if not newlines.size or marks[newlines[-1]] != n - 1:
+        # Ultima riga senza a capo: se ne aggiunge uno fittizio dopo il blocco
+        marks, kinds = np.append(marks, n), np.append(kinds, np.uint8(10))
+        newlines = np.append(newlines, len(marks) - 1)
+    ends = marks[newlines]
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    first = np.concatenate(([0], newlines[:-1] + 1))  # primo byte notevole della riga
+    crlf = (newlines > first) & (kinds[newlines - 1] == 13) & (marks[newlines - 1] == ends - 1)
+    content_ends = ends - crlf
+    nlines = len(starts)
+
+    # Byte notevoli diversi da virgole, a capo e CR finale di "\r\n"
+    other = (kinds != 44) & (kinds != 10)
+    other[newlines[crlf] - 1] = False
+    other = np.flatnonzero(other)
+    other_lines = np.searchsorted(newlines, other)
+    nother = np.bincount(other_lines, minlength=nlines)
+    ncommas = newlines - first - crlf - nother
+    # Righe da elaborare con csv.reader: spazi (che strip rimuoverebbe), CR
+    # isolati, NUL e altri caratteri di controllo, caratteri non ASCII
+    other_kinds = kinds[other]
+    slow = np.zeros(nlines, dtype=bool)
+    slow[other_lines[(other_kinds <= 32) | (other_kinds >= 128)]] = True
+    slow |= (ncommas >= 4) & (content_ends - starts > _MAX_LINE)
+
+    # Almeno 5 campi, cioe' almeno 4 virgole: sep contiene la fine dei
+    # primi tre campi e, solo per la tabella, del quarto e del quinto.
+    # Senza lettere le virgole sono consecutive in marks; dopo la quarta
+    # viene il CR o l'a capo, cioe' la fine del contenuto
+    fast = np.flatnonzero(~slow & (ncommas >= 4))
+    fields = np.arange(5 if columns else 3)
+    sep_index = first[fast, None] + fields
+    lettered = np.flatnonzero(nother[fast])
+    if lettered.size:
+        commas = np.flatnonzero(kinds == 44)
+        sep_index[lettered] = commas[np.minimum(np.searchsorted(commas, first[fast[lettered]])[:, None] + fields,
+                                                commas.size - 1)]
+    sep = marks[sep_index]
+    if columns:
+        sep[:, 4] = np.where(ncommas[fast] > 4, sep[:, 4], content_ends[fast])
+    # Per il solo CSV di latitudine e longitudine basta sapere se sono
+    # numeri diversi da zero: la mantissa serve solo a tabella e filtro
+    values = columns or record_filter is not None
+    lat, lat_ok = _parse_decimals(buf, starts[fast], sep[:, 0], values)
+    lon, lon_ok = _parse_decimals(buf, sep[:, 0] + 1, sep[:, 1], values)
+    depth, depth_ok = _parse_decimals(buf, sep[:, 1] + 1, sep[:, 2])
+    keep = np.flatnonzero(lat_ok & lon_ok & depth_ok & ((lat != 0.0) & (lon != 0.0) if values else lat & lon))
+    fast, sep, lat, lon, depth = fast[keep], sep[keep], lat[keep], lon[keep], depth[keep]
+    slow_lines = np.flatnonzero(slow)
+    slow_rows = {i: list(clean_rows(parse_rows(block[starts[i]:ends[i] + 1], encoding), surface_alt))
+                 for i in slow_lines}
+
+    if record_filter is not None:
+        # Il filtro deve vedere i record nell'ordine del file
+        slow_table = _rows_to_columns([row for rows in slow_rows.values() for row in rows], surface_alt)
+        lines = np.concatenate([fast, np.repeat(slow_lines, [len(rows) for rows in slow_rows.values()])])
+        order = np.argsort(lines, kind="stable")
+        values = np.concatenate([np.column_stack([lat, lon, depth]), slow_table[:, :3]])[order]
+        accepted = np.empty(len(lines), dtype=bool)
+        accepted[order] = record_filter.mask(values[:, 0], values[:, 1], values[:, 2])
+        keep = accepted[:len(fast)]
+        fast, sep, lat, lon, depth = fast[keep], sep[keep], lat[keep], lon[keep], depth[keep]
+        flags = iter(accepted[len(keep):].tolist())
+        slow_rows = {i: [row for row in rows if next(flags)] for i, rows in slow_rows.items()}
+    alt = surface_alt - depth
+
+    # Testo originale e suffisso ",quota\r\n" di ogni riga tenuta; le quote
+    # da formattare con Python e le righe lente si inseriscono dopo, nelle
+    # posizioni che spettano alle loro righe
+    text, text_columns, text_rows, fallback = _format_altitudes(alt)
+    out = _assemble(buf, starts[fast], content_ends[fast], text, text_columns, text_rows)
+    inserts = [(line, f",{alt_value:.2f}\r\n") for line, alt_value in zip(fast[fallback].tolist(),
+                                                                         alt[fallback].tolist())]
+    inserts += [(i, _write_rows(rows)) for i, rows in slow_rows.items() if rows]
+    if inserts:
+        inserts.sort(key=itemgetter(0))
+        line_ends = np.cumsum(content_ends[fast] - starts[fast] +
+                               text_columns.sum(axis=1)[text_rows])
+        # Righe tenute fino a quella dell'inserimento (compresa, per le quote)
+        kept = np.searchsorted(fast, [line for line, _ in inserts], side="right")
+        view = memoryview(out)
+        pieces, previous = [], 0
+        for count, (_, piece) in zip(kept.tolist(), inserts):
+            position = int(line_ends[count - 1]) if count else 0
+            pieces += [view[previous:position], piece.encode(encoding)]
+            previous = position
+        pieces.append(view[previous:])
+        out = b"".join(pieces)
+    else:
+        out = out.tobytes()
+    count = len(fast) + sum(map(len, slow_rows.values()))
+    if not columns:
+        return out, count, None
+
+    # Colonne nell'ordine delle righe di output
+    row_counts = np.zeros(nlines, dtype=np.int64)
+    row_counts[fast] = 1
+    for i, rows in slow_rows.items():
+        row_counts[i] = len(rows)
+    positions = np.cumsum(row_counts) - row_counts
+    table = np.empty((count, len(HEADER)), dtype=np.float64)
+    timestamp, _ = _parse_decimals(buf, sep[:, 2] + 1, sep[:, 3])
+    temperature, _ = _parse_decimals(buf, sep[:, 3] + 1, sep[:, 4])
+    table[positions[fast]] = np.column_stack([lat, lon, depth, timestamp, temperature, alt])
+    for i, rows in slow_rows.items():
+        table[positions[i]:positions[i] + len(rows)] = _rows_to_columns(rows, surface_alt)
+    return out, count, table
+
+
+class DepthGrid:
+    """Accumula i punti puliti in celle regolari di latitudine/longitudine.
+
+    Per ogni cella tiene numero di punti, media, minimo e massimo di
+    profondita' e quota, quindi la memoria dipende dalle celle occupate e
+    non dal numero di righe. ``cell_size`` e' in gradi oppure, con
+    ``metres=True``, in metri: in questo caso la dimensione in gradi viene
+    fissata alla latitudine ``origin_lat`` o, se non indicata, a quella del
+    primo punto, sufficiente per un lago.
+    """
+
+    def __init__(self, cell_size, metres=True, origin_lat=None):
+        if cell_size <= 0:
+            raise ValueError("Grid cell size must be greater than zero.")
+        self.cell_size = cell_size
+        self.metres = metres
+        self.cell_lat = None if metres else cell_size
+        self.cell_lon = None if metres else cell_size
+        # (riga, colonna) -> [n, somma, min, max profondita', somma, min, max quota]
+        self.cells = {}
+        if origin_lat is not None:
+            self._set_origin(origin_lat)
+
+    def _set_origin(self, lat):
+        if self.cell_lat is None:
+            self.cell_lat = self.cell_size / 111320.0
+            self.cell_lon = self.cell_size / (111320.0 * max(math.cos(math.radians(lat)), 1e-6))
+
+    def _update(self, key, count, depth_sum, depth_min, depth_max, alt_sum, alt_min, alt_max):
+        cell = self.cells.get(key)
+        if cell is None:
+            self.cells[key] = [count, depth_sum, depth_min, depth_max, alt_sum, alt_min, alt_max]
+            return
+        cell[0] += count
+        cell[1] += depth_sum
+        cell[2] = min(cell[2], depth_min)
+        cell[3] = max(cell[3], depth_max)
+        cell[4] += alt_sum
+        cell[5] = min(cell[5], alt_min)
+        cell[6] = max(cell[6], alt_max)
+
+    def add(self, lat, lon, depth, alt):
+        if not (abs(lat) <= 90 and abs(lon) <= 180 and math.isfinite(depth)):
+            return  # nan, inf o coordinate impossibili passano is_valid, ma non hanno una cella
+        self._set_origin(lat)
+        key = (math.floor(lat / self.cell_lat), math.floor(lon / self.cell_lon))
+        self._update(key, 1, depth, depth, depth, alt, alt, alt)
+
+    def add_rows(self, rows, surface_alt):
+        """Aggiunge le righe prodotte da clean_rows.
+
+        Con NumPy le righe passano da add_table: le somme delle celle vengono
+        calcolate nello stesso ordine della modalita' colonnare, quindi le
+        medie coincidono fino all'ultima cifra.
+        """
+        if np is not None:
+            self.add_table(_rows_to_columns(rows, surface_alt))
+            return
+        for row in rows:
+            depth = float(row[2])
+            self.add(float(row[0]), float(row[1]), depth, surface_alt - depth)
+
+    def add_table(self, table):
+        """Aggiunge la tabella di clean_block_columnar, aggregando prima con NumPy."""
+        table = table[(np.abs(table[:, 0]) <= 90) & (np.abs(table[:, 1]) <= 180) & np.isfinite(table[:, 2])]
+        if not len(table):
+            return
+        lat, lon, depth, alt = table[:, 0], table[:, 1], table[:, 2], table[:, 5]
+        self._set_origin(float(lat[0]))
+        rows = np.floor(lat / self.cell_lat).astype(np.int64)
+        cols = np.floor(lon / self.cell_lon).astype(np.int64)
+        order = np.lexsort((cols, rows))
+        rows, cols, depth, alt = rows[order], cols[order], depth[order], alt[order]
+        starts = np.flatnonzero(np.concatenate(([True], (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1]))))
+        counts = np.diff(np.append(starts, len(rows)))
+        stats = zip(rows[starts].tolist(), cols[starts].tolist(), counts.tolist(),
+                    np.add.reduceat(depth, starts).tolist(), np.minimum.reduceat(depth, starts).tolist(),
+                    np.maximum.reduceat(depth, starts).tolist(), np.add.reduceat(alt, starts).tolist(),
+                    np.minimum.reduceat(alt, starts).tolist(), np.maximum.reduceat(alt, starts).tolist())
+        for row, col, *values in stats:
+            self._update((row, col), *values)
+
+    def merge(self, cells):
+        """Aggiunge le celle di un'altra griglia con la stessa dimensione e origine."""
+        for key, values in cells.items():
+            self._update(key, *values)
+
+    def values(self):
+        """Centro e statistiche (colonne di GRID_HEADER) di ogni cella, in ordine."""
+        for (row, col), (count, depth_sum, depth_min, depth_max, alt_sum, alt_min, alt_max) \
+                in sorted(self.cells.items()):
+            yield ((row + 0.5) * self.cell_lat, (col + 0.5) * self.cell_lon, count,
+                   depth_sum / count, depth_min, depth_max, alt_sum / count, alt_min, alt_max)
+
+    def rows(self):
+        """Righe CSV delle celle."""
+        for lat, lon, count, *stats in self.values():
+            yield [f"{lat:.7f}", f"{lon:.7f}", count] + [f"{value:.2f}" for value in stats]
+
+    def records(self):
+        """Celle come array strutturato NumPy (GRID_NPY_DTYPE)."""
+        return np.array(list(self.values()), dtype=GRID_NPY_DTYPE)
+
+
+def _npy_header(dtype, count):
+    """Intestazione .npy (versione 1.0) di NPY_HEADER_SIZE bytes per ``count`` record."""
+    header = repr({"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                   "fortran_order": False, "shape": (count,)})
+    header = header.ljust(NPY_HEADER_SIZE - 11) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+def _to_records(table):
+    """Converte la tabella float64 di clean_block_columnar nei record di NPY_DTYPE."""
+    records = np.empty(len(table), dtype=NPY_DTYPE)
+    for i, (name, _) in enumerate(NPY_DTYPE):
+        records[name] = table[:, i]
+    return records
+
+
+def output_format_for(path):
+    """Formato di output dedotto dall'estensione: "npy" oppure "csv"."""
+    return "npy" if path.lower().endswith(".npy") else "csv"
+
+
+def _fingerprint(path, offset):
+    """Impronta dei primi ``offset`` bytes di ``path`` (inizio e fine, non tutto il file)."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as infile:
+        digest.update(infile.read(min(offset, FINGERPRINT_SIZE)))
+        infile.seek(max(0, offset - FINGERPRINT_SIZE))
+        digest.update(infile.read(min(offset, FINGERPRINT_SIZE)))
+    return digest.hexdigest()
+
+
+def _load_state(input_path, output_path, settings):
+    """Stato salvato da una pulizia incrementale, None se non riutilizzabile.
+
+    Lo stato vale solo se le opzioni coincidono, l'output non e' stato
+    modificato e l'input e' cresciuto senza cambiare la parte gia' pulita.
+    """
+    try:
+        with open(f"{output_path}.state", encoding="utf-8") as infile:
+            state = json.load(infile)
+        if (state.get("version") != STATE_VERSION or state["settings"] != settings
+                or os.path.getsize(output_path) < state["output_size"]
+                or os.path.getsize(input_path) < state["offset"]
+                or _fingerprint(input_path, state["offset"]) != state["fingerprint"]):
+            return None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return state
+
+
+@contextlib.contextmanager
+def _atomic_path(path):
+    """Restituisce un percorso temporaneo che alla fine del blocco sostituisce ``path``.
+
+    Se il blocco fallisce il file temporaneo viene rimosso e ``path`` resta
+    com'era.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _save_state(output_path, state):
+    with _atomic_path(f"{output_path}.state") as tmp_path, open(tmp_path, "w", encoding="utf-8") as outfile:
+        json.dump(state, outfile)
+
+
+def clean_file(input_path, output_path, surface_alt=0.0, chunk_size=CHUNK_SIZE,
+               encoding=None, progress=None, should_cancel=None, columnar=False,
+               grid_size=None, grid_metres=True, output_format=None, filter_records=False,
+               incremental=False, grid=None):
+    """Pulisce ``input_path`` e scrive il risultato in ``output_path``.
+
+    ``progress``, se indicato, viene chiamato dopo ogni blocco con
+    (bytes letti, dimensione totale); se ``should_cancel`` restituisce True
+    l'elaborazione si interrompe con ``CleaningCancelled``. Con
+    ``columnar=True`` i blocchi vengono elaborati con NumPy
+    (clean_block_columnar). Con ``grid_size`` i punti vengono accumulati in
+    un DepthGrid (celle in metri o, con ``grid_metres=False``, in gradi) e
+    l'output contiene una riga per cella; in alternativa ``grid`` e' un
+    DepthGrid gia' creato in cui accumulare i punti (con ``output_path``
+    None non viene scritto nulla e le celle restano solo in ``grid``). ``output_format`` ("csv" o "npy",
+    di default dall'estensione di ``output_path``) sceglie tra CSV e array
+    NumPy binario mappabile in memoria. Con ``filter_records=True`` un
+    RecordFilter scarta anche ping ripetuti e picchi di profondita'.
+    L'output viene scritto in un file temporaneo rinominato solo a lavoro
+    concluso, quindi un file di destinazione esistente non resta mai a
+    meta'. Con ``incremental=True`` accanto all'output viene salvato un
+    file ``.state``: se l'input e' solo cresciuto, le esecuzioni successive
+    puliscono solo le righe nuove e le aggiungono all'output esistente.
+    Restituisce un dizionario con le statistiche dell'elaborazione.
+    """
+    if output_path is None and grid is None:
+        raise ValueError("An output path is required unless the points go to a grid.")
+    binary = output_path is not None and (output_format or output_format_for(output_path)) == "npy"
+    if (columnar or binary) and not COLUMNAR_AVAILABLE:
+        raise RuntimeError("Columnar mode and .npy output require NumPy (pip install numpy).")
+    if grid is None and grid_size:
+        grid = DepthGrid(grid_size, grid_metres)
+    if incremental and grid is not None:
+        raise ValueError("Incremental cleaning does not support grid output.")
+    encoding = encoding or locale.getpreferredencoding(False)
+    record_filter = RecordFilter() if filter_records else None
+    settings = {"surface_alt": surface_alt, "encoding": encoding, "binary": binary,
+                "filter_records": filter_records}
+    state = _load_state(input_path, output_path, settings) if incremental else None
+    total = os.path.getsize(input_path)
+    stats = {"rows_read": 0, "rows_written": 0, "bytes_read": 0, "bytes_total": total, "elapsed": 0.0}
+    start = time.perf_counter()
+
+    if state:
+        # Si riparte dall'ultima riga completa gia' pulita, in coda all'output
+        if record_filter is not None:
+            record_filter.restore(state["filter"])
+        stats["resumed_from"] = state["offset"]
+        target = output_path
+        outfile = open(output_path, "r+b", buffering=BUFFER_SIZE)
+        outfile.truncate(state["output_size"])
+        outfile.seek(state["output_size"])
+    elif output_path is None:
+        target = None
+        outfile = contextlib.nullcontext()
+    else:
+        target = f"{output_path}.{os.getpid()}.tmp"
+        outfile = open(target, "wb", buffering=BUFFER_SIZE)
+    previous_rows = state["rows"] if state else 0
+    checkpoint = state
+    text_out = None
+    try:
+        with open(input_path, "rb") as infile, outfile:
+            if state:
+                infile.seek(state["offset"])
+            elif binary:
+                outfile.write(b"\0" * NPY_HEADER_SIZE)
+            elif target is not None:
+                outfile.write(_write_rows([GRID_HEADER if grid else HEADER]).encode(encoding))
+            if not (columnar or binary or grid is not None):
+                # CSV normale: csv.writer scrive direttamente sul file, senza
+                # serializzare ogni blocco in una stringa da codificare
+                text_out = io.TextIOWrapper(outfile, encoding=encoding, newline="")
+                writer = csv.writer(text_out)
+            for offset, block in read_blocks(infile, chunk_size):
+                if should_cancel and should_cancel():
+                    raise CleaningCancelled()
+                if columnar:
+                    data, count, table = clean_block_columnar(block, surface_alt, encoding,
+                                                              columns=grid is not None or binary,
+                                                              record_filter=record_filter)
+                    if grid is not None:
+                        grid.add_table(table)
+                elif grid is not None or binary:
+                    rows = list(clean_rows(parse_rows(block, encoding), surface_alt))
+                    if record_filter is not None:
+                        rows = record_filter.filter_rows(rows)
+                    count = len(rows)
+                    if grid is not None:
+                        grid.add_rows(rows, surface_alt)
+                    else:
+                        table = _rows_to_columns(rows, surface_alt)
+                else:
+                    count = write_clean_block(writer, block, surface_alt, encoding, record_filter)
+                if grid is None and text_out is None:
+                    outfile.write(_to_records(table).tobytes() if binary else data)
+                stats["rows_read"] += block.count(b"\n") + (not block.endswith(b"\n"))
+                stats["rows_written"] += count
+                stats["bytes_read"] = offset - (state["offset"] if state else 0)
+                if incremental and block.endswith(b"\n"):
+                    # Un'ultima riga senza a capo puo' essere ancora incompleta:
+                    # la prossima esecuzione la rielabora
+                    if text_out is not None:
+                        text_out.flush()
+                    checkpoint = {"version": STATE_VERSION, "settings": settings, "offset": offset,
+                                  "output_size": outfile.tell(), "rows": previous_rows + stats["rows_written"],
+                                  "filter": record_filter.state() if record_filter is not None else None}
+                if progress:
+                    progress(offset, total)
+            if text_out is not None:
+                text_out.detach()  # scrive il resto senza chiudere outfile
+            if grid is not None:
+                stats["points"] = stats["rows_written"]
+                stats["rows_written"] = len(grid.cells)
+                if target is not None:
+                    outfile.write(grid.records().tobytes() if binary
+                                  else _write_rows(grid.rows()).encode(encoding))
+            if binary:
+                outfile.seek(0)
+                outfile.write(_npy_header(GRID_NPY_DTYPE if grid else NPY_DTYPE,
+                                          previous_rows + stats["rows_written"]))
+            if record_filter is not None:
+                stats["duplicates"] = record_filter.duplicates
+                stats["spikes"] = record_filter.spikes
+        if not state and target is not None:
+            os.replace(target, output_path)
+    except BaseException:
+        if state:
+            # Output riportato com'era prima di questa esecuzione (a meno della
+            # coda senza a capo, che verra' rielaborata)
+            with open(output_path, "r+b") as outfile:
+                outfile.truncate(state["output_size"])
+                if binary:
+                    outfile.write(_npy_header(NPY_DTYPE, state["rows"]))
+        elif target is not None and os.path.exists(target):
+            os.remove(target)
+        raise
+
+    if incremental:
+        if checkpoint is None:
+            checkpoint = {"version": STATE_VERSION, "settings": settings, "offset": 0,
+                          "output_size": NPY_HEADER_SIZE if binary else len(
+                              _write_rows([HEADER]).encode(encoding)),
+                          "rows": 0, "filter": None}
+        checkpoint["fingerprint"] = _fingerprint(input_path, checkpoint["offset"])
+        _save_state(output_path, checkpoint)
+    elif os.path.exists(f"{output_path}.state"):
+        os.remove(f"{output_path}.state")  # Non piu' valido per il nuovo output
+    stats["elapsed"] = time.perf_counter() - start
+    return stats
+
+
+def format_stats(stats):
+    """Riassunto leggibile delle statistiche di ``clean_file``."""
+    elapsed = max(stats["elapsed"], 1e-9)
+    points = stats.get("points", stats["rows_written"])
+    cells = f" ({points} points gridded)" if "points" in stats else ""
+    if "resumed_from" in stats:
+        cells += f", resumed after {stats['resumed_from'] / 1e6:.1f} MB"
+    if "duplicates" in stats:
+        cells += f", {stats['duplicates']} duplicates and {stats['spikes']} spikes dropped"
+    return (f"{stats['rows_written']} rows written{cells}, {stats['bytes_read'] / 1e6:.1f} MB read "
+            f"in {stats['elapsed']:.2f} s "
+            f"({points / elapsed:.0f} rows/s, {stats['bytes_read'] / 1e6 / elapsed:.1f} MB/s)")
+
+
+def parse_surface_alt(text):
+    """Interpreta la quota superficie, accettando anche la virgola decimale."""
+    text = text.replace(",", ".").strip()
+    return float(text) if text else 0.0
+
+
+def read_altitudes(path):
+    """Legge il file delle quote superficie per la pulizia di una cartella.
+
+    E' un CSV con nome del file (percorso relativo alla cartella o solo
+    nome) e quota superficie; un'eventuale intestazione viene ignorata.
+    """
+    altitudes = {}
+    with open(path, newline="") as file:
+        for row in csv.reader(file):
+            if len(row) < 2:
+                continue
+            try:
+                altitudes[row[0].strip().replace("\\", "/")] = parse_surface_alt(row[1])
+            except ValueError:
+                continue  # intestazione o quota non numerica
+    return altitudes
+
+
+def find_csv_files(input_dir):
+    """Tutti i CSV contenuti in ``input_dir`` e nelle sottocartelle, in ordine."""
+    found = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(".csv"):
+                found.append(os.path.relpath(os.path.join(root, name), input_dir))
+    return found
+
+
+def _is_inside(path, folder):
+    """True se ``path`` coincide con ``folder`` o si trova al suo interno (link risolti)."""
+    path, folder = os.path.realpath(path), os.path.realpath(folder)
+    return os.path.commonpath([path, folder]) == folder
+
+
+# Evento di annullamento condiviso con i processi del pool (impostato da _init_worker)
+_cancel_event = None
+
+
+def _init_worker(cancel_event):
+    global _cancel_event
+    _cancel_event = cancel_event
+
+
+def _clean_one(input_path, output_path, surface_alt, options):
+    # Eseguita nei processi del pool: deve restare a livello di modulo. L'evento
+    # viene controllato a ogni blocco, cosi' anche i file gia' avviati si fermano
+    return clean_file(input_path, output_path, surface_alt, should_cancel=_cancel_event.is_set, **options)
+
+
+def _grid_one(input_path, output_path, surface_alt, options):
+    # Come _clean_one, ma restituisce le celle invece di scrivere ``output_path``:
+    # clean_folder le unisce in un'unica griglia con l'origine comune ``grid_origin``
+    options = dict(options)
+    grid = DepthGrid(options.pop("grid_size"), options.pop("grid_metres", True), options.pop("grid_origin"))
+    stats = clean_file(input_path, None, surface_alt, should_cancel=_cancel_event.is_set, grid=grid,
+                       **options)
+    stats["cells"] = grid.cells
+    return stats
+
+
+def _first_latitude(paths, encoding=None):
+    """Latitudine del primo punto valido dei file ``paths`` (None se non ce ne sono)."""
+    encoding = encoding or locale.getpreferredencoding(False)
+    for path in paths:
+        with open(path, "rb") as infile:
+            for _, block in read_blocks(infile):
+                for row in clean_rows(parse_rows(block, encoding)):
+                    if abs(float(row[0])) <= 90:
+                        return float(row[0])
+    return None
+
+
+def clean_folder(input_dir, output, altitudes=None, surface_alt=0.0, merge=False,
+                 workers=None, progress=None, should_cancel=None, **options):
+    """Pulisce tutti i CSV di ``input_dir`` (ricorsivamente) in parallelo.
+
+    Ogni file viene pulito in un processo separato, con la quota presa da
+    ``altitudes`` (percorso relativo o nome del file) oppure ``surface_alt``.
+    Con ``merge=True`` ``output`` e' un unico file (CSV o .npy) con tutte le
+    righe, nello stesso ordine dei file (con ``grid_size`` un'unica griglia,
+    le cui celle riuniscono i punti di tutti i file); altrimenti e' una
+    cartella che riproduce quella di input (con ``output_format="npy"`` i file hanno
+    estensione .npy). ``output`` non puo' trovarsi dentro ``input_dir``,
+    altrimenti i file puliti verrebbero ripuliti alla prossima esecuzione.
+    ``progress`` riceve (bytes elaborati, bytes totali) a ogni file
+    completato; se ``should_cancel`` restituisce True anche i file in corso
+    si interrompono al blocco successivo. Le altre opzioni (``columnar``, ``grid_size``...) vengono
+    passate a clean_file. Restituisce la lista dei riepiloghi per file.
+    """
+    altitudes = altitudes or {}
+    merged_grid = None
+    if _is_inside(output, input_dir):
+        raise ValueError("The output must be outside the input folder.")
+    files = find_csv_files(input_dir)
+    sizes = {name: os.path.getsize(os.path.join(input_dir, name)) for name in files}
+    total = sum(sizes.values())
+    if merge and options.get("incremental"):
+        raise ValueError("Incremental cleaning cannot be combined with merging.")
+    if merge:
+        # I file parziali hanno estensione .tmp: il formato va indicato
+        options["output_format"] = options.get("output_format") or output_format_for(output)
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        targets = {name: f"{output}.part{i}.tmp" for i, name in enumerate(files)}
+        if options.get("grid_size"):
+            # Celle allineate tra i file: in metri tutti usano l'origine del primo punto
+            metres = options.get("grid_metres", True)
+            options["grid_origin"] = _first_latitude(
+                [os.path.join(input_dir, name) for name in files], options.get("encoding")) if metres else None
+            merged_grid = DepthGrid(options["grid_size"], metres, options["grid_origin"])
+    else:
+        binary = options.get("output_format") == "npy"
+        targets = {name: os.path.join(output, os.path.splitext(name)[0] + ".npy" if binary else name)
+                   for name in files}
+        for target in targets.values():
+            os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+
+    results = {}
+    done = 0
+    worker = _clean_one if merged_grid is None else _grid_one
+    cancel_event = multiprocessing.Event()
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                                 initargs=(cancel_event,)) as pool:
+            futures = {}
+            for name in files:
+                key = name.replace(os.sep, "/")
+                alt = altitudes.get(key, altitudes.get(os.path.basename(name), surface_alt))
+                future = pool.submit(worker, os.path.join(input_dir, name), targets[name], alt, options)
+                futures[future] = (name, alt)
+            pending = set(futures)
+            while pending:
+                # Attesa a intervalli brevi: l'annullamento non aspetta la fine di un file
+                finished, pending = wait(pending, timeout=CANCEL_POLL, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name, alt = futures[future]
+                    try:
+                        stats = future.result()
+                        stats["error"] = None
+                        if merged_grid is not None:
+                            merged_grid.merge(stats.pop("cells"))
+                    except CleaningCancelled:
+                        continue
+                    except Exception as e:
+                        stats = {"rows_read": 0, "rows_written": 0, "bytes_read": 0, "elapsed": 0.0,
+                                 "error": str(e)}
+                    stats.update(file=name, surface_alt=alt)
+                    results[name] = stats
+                    done += sizes[name]
+                    if progress:
+                        progress(done, total)
+                if should_cancel and should_cancel():
+                    cancel_event.set()
+                    pool.shutdown(cancel_futures=True)
+                    raise CleaningCancelled()
+
+        if merge:
+            parts = [targets[name] for name in files if not results[name]["error"]]
+            if merged_grid is not None:
+                _write_grid(merged_grid, output, options["output_format"] == "npy", options.get("encoding"))
+            elif options["output_format"] == "npy":
+                _merge_npy(parts, output)
+            else:
+                _merge_outputs(parts, output)
+    finally:
+        if merge:
+            for target in targets.values():
+                if os.path.exists(target):
+                    os.remove(target)
+
+    return [results[name] for name in files]
+
+
+def _write_grid(grid, output_path, binary=False, encoding=None):
+    """Scrive le celle di ``grid`` (CSV con GRID_HEADER o .npy con GRID_NPY_DTYPE)."""
+    with _atomic_path(output_path) as tmp_path, open(tmp_path, "wb") as outfile:
+        if binary:
+            records = grid.records()
+            outfile.write(_npy_header(GRID_NPY_DTYPE, len(records)))
+            outfile.write(records.tobytes())
+        else:
+            encoding = encoding or locale.getpreferredencoding(False)
+            outfile.write(_write_rows([GRID_HEADER]).encode(encoding))
+            outfile.write(_write_rows(grid.rows()).encode(encoding))
+
+
+def _merge_outputs(parts, output_path):
+    """Unisce i CSV puliti tenendo una sola intestazione."""
+    with _atomic_path(output_path) as tmp_path, open(tmp_path, "wb") as outfile:
+        outfile.write(_write_rows([HEADER]).encode(locale.getpreferredencoding(False)))
+        for part in parts:
+            with open(part, "rb") as infile:
+                infile.readline()  # intestazione
+                shutil.copyfileobj(infile, outfile, BUFFER_SIZE)
+
+
+def _merge_npy(parts, output_path):
+    """Unisce i file .npy puliti (stesso dtype) in un unico array."""
+    headers = []
+    for part in parts:
+        with open(part, "rb") as infile:
+            np.lib.format.read_magic(infile)
+            shape, _, dtype = np.lib.format.read_array_header_1_0(infile)
+            headers.append((shape[0], dtype, infile.tell()))
+    dtype = headers[0][1] if headers else np.dtype(NPY_DTYPE)
+    with _atomic_path(output_path) as tmp_path, open(tmp_path, "wb") as outfile:
+        outfile.write(_npy_header(dtype, sum(count for count, _, _ in headers)))
+        for part, (_, _, data_offset) in zip(parts, headers):
+            with open(part, "rb") as infile:
+                infile.seek(data_offset)
+                shutil.copyfileobj(infile, outfile, BUFFER_SIZE)
+
+
+def format_batch_summary(results):
+    """Riepilogo per file e complessivo di ``clean_folder``."""
+    lines = []
+    for stats in results:
+        if stats["error"]:
+            lines.append(f"{stats['file']}: ERROR {stats['error']}")
+            continue
+        kept = stats.get("points", stats["rows_written"])
+        lines.append(f"{stats['file']}: {kept} rows kept, {stats['rows_read'] - kept} dropped "
+                     f"(surface {stats['surface_alt']:g} m) in {stats['elapsed']:.2f} s")
+    kept = sum(stats.get("points", stats["rows_written"]) for stats in results)
+    read = sum(stats["rows_read"] for stats in results)
+    failed = sum(1 for stats in results if stats["error"])
+    lines.append(f"Total: {len(results)} files ({failed} failed), {kept} rows kept, {read - kept} dropped")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Clean Deeper sonar CSV data (Arc-Team Tools).")
+    parser.add_argument("input", help="input CSV file exported by Deeper, or a folder of CSV files")
+    parser.add_argument("output", help="cleaned output CSV or .npy file (output folder when cleaning a folder)")
+    parser.add_argument("--surface-alt", default="0", metavar="METRES",
+                        help="surface altitude in m above sea level (default: 0)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, metavar="BYTES",
+                        help=f"read block size in bytes (default: {CHUNK_SIZE})")
+    parser.add_argument("--columnar", action="store_true",
+                        help="vectorized NumPy cleaning, same output as the default mode")
+    parser.add_argument("--grid", type=float, metavar="SIZE",
+                        help="decimate points into grid cells of SIZE metres, one output row per cell")
+    parser.add_argument("--grid-degrees", action="store_true",
+                        help="grid cell SIZE is in degrees of latitude/longitude instead of metres")
+    parser.add_argument("--filter", action="store_true", dest="filter_records",
+                        help="also drop repeated pings and depth spikes (rolling median/MAD)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="keep a .state file next to the output and, when the input has only grown, "
+                             "clean just the new rows and append them")
+    parser.add_argument("--format", choices=["csv", "npy"], dest="output_format",
+                        help="output format (default: from the output extension, .npy = binary "
+                             "NumPy array readable with numpy.load(path, mmap_mode='r'))")
+    batch = parser.add_argument_group("folder mode")
+    batch.add_argument("--altitudes", metavar="CSV",
+                       help="CSV of file name and surface altitude, overriding --surface-alt per file")
+    batch.add_argument("--merge", action="store_true",
+                       help="merge all cleaned files into the single output CSV")
+    batch.add_argument("--workers", type=int, metavar="N",
+                       help="number of worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    try:
+        surface_alt = parse_surface_alt(args.surface_alt)
+    except ValueError:
+        parser.error("please enter a valid number for surface altitude")
+
+    try:
+        if os.path.isdir(args.input):
+            altitudes = read_altitudes(args.altitudes) if args.altitudes else None
+            start = time.perf_counter()
+            results = clean_folder(args.input, args.output, altitudes, surface_alt, merge=args.merge,
+                                   workers=args.workers, columnar=args.columnar,
+                                   grid_size=args.grid, grid_metres=not args.grid_degrees,
+                                   output_format=args.output_format, filter_records=args.filter_records,
+                                   incremental=args.incremental,
+                                   progress=lambda done, total: print(
+                                       f"\r{done / max(total, 1):.0%} of {total / 1e6:.1f} MB",
+                                       end="", file=sys.stderr))
+            print(file=sys.stderr)
+            print(format_batch_summary(results))
+            print(f"Elapsed: {time.perf_counter() - start:.2f} s", file=sys.stderr)
+            return 1 if any(stats["error"] for stats in results) else 0
+        stats = clean_file(args.input, args.output, surface_alt, chunk_size=args.chunk_size,
+                           columnar=args.columnar, grid_size=args.grid,
+                           grid_metres=not args.grid_degrees, output_format=args.output_format,
+                           filter_records=args.filter_records, incremental=args.incremental)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print("Cancelled, output file left untouched.", file=sys.stderr)
+        return 130
+
+    print(format_stats(stats), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,42 @@
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QFileDialog,
                              QLabel, QVBoxLayout, QWidget, QMessageBox, QStatusBar,
-                             QHBoxLayout, QLineEdit)
+                             QHBoxLayout, QLineEdit, QProgressBar, QCheckBox)
+from PyQt5.QtCore import QThread, pyqtSignal
 from PyQt5.QtGui import QIcon, QPixmap
-import csv
 import sys
 import os
+import time
+from functools import partial
+
+from at_deeper_cleaner_core import (COLUMNAR_AVAILABLE, CleaningCancelled, clean_file,
+                                    clean_folder, format_batch_summary, parse_surface_alt,
+                                    read_altitudes)
+
+OUTPUT_FILTER = "CSV Files (*.csv);;NumPy Arrays (*.npy)"
+
+
+class CleanWorker(QThread):
+    """Esegue clean_file o clean_folder fuori dal thread della GUI."""
+    # object invece di int: i file oltre i 2 GB superano il limite di un int C++
+    progress = pyqtSignal(object, object)
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, job, parent=None):
+        super().__init__(parent)
+        self.job = job
+
+    def run(self):
+        try:
+            stats = self.job(progress=self.progress.emit, should_cancel=self.isInterruptionRequested)
+        except CleaningCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.succeeded.emit(stats)
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -54,18 +86,49 @@ class MainWindow(QMainWindow):
         layout.addWidget(self.button_select_input)
 
         # Output file
-        self.label_output = QLabel("Select output CSV file:")
+        self.label_output = QLabel("Select output file (CSV, or .npy for a binary NumPy array):")
         layout.addWidget(self.label_output)
         self.button_select_output = QPushButton("Choose Output File")
         self.button_select_output.clicked.connect(self.open_output_file_dialog)
         layout.addWidget(self.button_select_output)
 
+        # Griglia facoltativa: una riga per cella invece che per punto
+        self.label_grid = QLabel("Grid cell size (m, empty = keep every point):")
+        layout.addWidget(self.label_grid)
+        self.input_grid = QLineEdit()
+        self.input_grid.setPlaceholderText("e.g. 2")
+        layout.addWidget(self.input_grid)
+
+        # Filtro di ping ripetuti e picchi di profondita'
+        self.check_filter = QCheckBox("Drop duplicate pings and depth spikes")
+        layout.addWidget(self.check_filter)
+
+        # Rilancio su un log in crescita: solo le righe nuove
+        self.check_incremental = QCheckBox("Only clean rows added since the last run")
+        layout.addWidget(self.check_incremental)
+
+        # Modalita' veloce con NumPy (stesso output)
+        self.check_columnar = QCheckBox("Fast columnar mode (NumPy)")
+        self.check_columnar.setChecked(COLUMNAR_AVAILABLE)
+        self.check_columnar.setEnabled(COLUMNAR_AVAILABLE)
+        layout.addWidget(self.check_columnar)
+
         # Clean button
         self.button_clean = QPushButton("Clean Data")
         self.button_clean.clicked.connect(self.clean_data)
         self.button_clean.setEnabled(False)
         layout.addWidget(self.button_clean)
 
+        # Pulizia di tutti i CSV di una cartella (anche sottocartelle)
+        self.button_clean_folder = QPushButton("Clean Folder...")
+        self.button_clean_folder.clicked.connect(self.clean_folder_dialog)
+        layout.addWidget(self.button_clean_folder)
+
+        self.button_cancel = QPushButton("Cancel")
+        self.button_cancel.clicked.connect(self.cancel_cleaning)
+        self.button_cancel.setEnabled(False)
+        layout.addWidget(self.button_cancel)
+
         container = QWidget()
         container.setLayout(layout)
         self.setCentralWidget(container)
@@ -73,6 +136,13 @@ class MainWindow(QMainWindow):
         # Status bar
         self.statusBar = QStatusBar()
         self.setStatusBar(self.statusBar)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 1000)
+        self.progress_bar.setTextVisible(False)
+        self.progress_bar.hide()
+        self.statusBar.addWidget(self.progress_bar)
+        self.progress_label = QLabel()
+        self.statusBar.addWidget(self.progress_label)
         status_layout = QHBoxLayout()
         status_label = QLabel("Powered by Arc-Team")
         status_layout.addWidget(status_label)
@@ -86,6 +156,8 @@ class MainWindow(QMainWindow):
 
         self.input_file_path = None
         self.output_file_path = None
+        self.worker = None
+        self.start_time = None
 
     def open_input_file_dialog(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "Choose Input File", "", "CSV Files (*.csv)")
@@ -95,60 +167,149 @@ class MainWindow(QMainWindow):
             self.check_if_ready_to_clean()
 
     def open_output_file_dialog(self):
-        file_path, _ = QFileDialog.getSaveFileName(self, "Choose Output File", "", "CSV Files (*.csv)")
+        file_path, _ = QFileDialog.getSaveFileName(self, "Choose Output File", "", OUTPUT_FILTER)
         if file_path:
             self.output_file_path = file_path
             self.label_output.setText(f"Output file: {file_path}")
             self.check_if_ready_to_clean()
 
     def check_if_ready_to_clean(self):
-        self.button_clean.setEnabled(self.input_file_path is not None and self.output_file_path is not None)
+        running = self.worker is not None
+        self.button_clean.setEnabled(not running and self.input_file_path is not None and self.output_file_path is not None)
+        self.button_clean_folder.setEnabled(not running)
+
+    def read_surface_alt(self):
+        try:
+            return parse_surface_alt(self.input_surface.text())
+        except ValueError:
+            QMessageBox.warning(self, "Input Error", "Please enter a valid number for surface altitude.")
+            return None
+
+    def read_options(self):
+        """Opzioni comuni a clean_file e clean_folder, None se non valide."""
+        grid_text = self.input_grid.text().replace(',', '.').strip()
+        try:
+            grid_size = float(grid_text) if grid_text else None
+        except ValueError:
+            grid_size = -1
+        if grid_size is not None and grid_size <= 0:
+            QMessageBox.warning(self, "Input Error", "Please enter a positive number for grid cell size.")
+            return None
+        return {"columnar": self.check_columnar.isChecked(), "grid_size": grid_size,
+                "filter_records": self.check_filter.isChecked(),
+                "incremental": self.check_incremental.isChecked()}
 
     def clean_data(self):
         if not self.input_file_path or not self.output_file_path:
             return
 
         # Recupero e validazione della quota superficie
-        surface_alt_str = self.input_surface.text().replace(',', '.')
-        try:
-            surface_alt = float(surface_alt_str) if surface_alt_str else 0.0
-        except ValueError:
-            QMessageBox.warning(self, "Input Error", "Please enter a valid number for surface altitude.")
+        surface_alt = self.read_surface_alt()
+        options = self.read_options()
+        if surface_alt is None or options is None:
             return
 
-        # Aggiornato l'header con il nuovo campo
-        header = ["latitude", "longitude", "depth", "timestamp", "temperature", "altitude_asl"]
-
-        def is_valid(row):
-            if len(row) < 5: # Modificato a < 5 per sicurezza
-                return False
-            try:
-                lat, lon = float(row[0]), float(row[1])
-                return lat != 0.0 and lon != 0.0
-            except ValueError:
-                return False
+        job = partial(clean_file, self.input_file_path, self.output_file_path, surface_alt, **options)
+        self.start_worker(job, self.cleaning_succeeded)
 
+    def clean_folder_dialog(self):
+        surface_alt = self.read_surface_alt()
+        options = self.read_options()
+        if surface_alt is None or options is None:
+            return
+        input_dir = QFileDialog.getExistingDirectory(self, "Choose Input Folder")
+        if not input_dir:
+            return
+        merge = QMessageBox.question(
+            self, "Clean Folder", "Merge all cleaned files into a single file?") == QMessageBox.Yes
+        if merge:
+            output, _ = QFileDialog.getSaveFileName(self, "Choose Output File", "", OUTPUT_FILTER)
+        else:
+            output = QFileDialog.getExistingDirectory(self, "Choose Output Folder")
+        if not output:
+            return
+        # Quote superficie per file (facoltativo): CSV con nome file e quota
+        altitudes_path, _ = QFileDialog.getOpenFileName(
+            self, "Choose Surface Altitudes File (optional)", input_dir, "CSV Files (*.csv)")
         try:
-            with open(self.input_file_path, newline='') as infile, open(self.output_file_path, 'w', newline='') as outfile:
-                reader = csv.reader(infile)
-                writer = csv.writer(outfile)
-                writer.writerow(header)
-
-                for row in reader:
-                    row = [item.strip() for item in row]
-                    if is_valid(row):
-                        try:
-                            depth = float(row[2])
-                            # Calcolo: Quota Superficie - Profondità
-                            alt_asl = surface_alt - depth
-                            row.append(f"{alt_asl:.2f}") # Aggiunge il valore calcolato
-                            writer.writerow(row)
-                        except ValueError:
-                            continue # Salta righe con depth non numerica
-
-            QMessageBox.information(self, "Success", f"Cleaned data with ASL altitude saved to {self.output_file_path}!")
-        except Exception as e:
+            altitudes = read_altitudes(altitudes_path) if altitudes_path else None
+        except OSError as e:
             QMessageBox.critical(self, "Error", f"An error occurred: {str(e)}")
+            return
+
+        job = partial(clean_folder, input_dir, output, altitudes, surface_alt, merge=merge, **options)
+        self.start_worker(job, self.folder_succeeded)
+
+    def start_worker(self, job, on_success):
+        self.worker = CleanWorker(job, self)
+        self.worker.progress.connect(self.update_progress)
+        self.worker.succeeded.connect(on_success)
+        self.worker.failed.connect(self.cleaning_failed)
+        self.worker.cancelled.connect(self.cleaning_cancelled)
+        self.worker.finished.connect(self.cleaning_finished)
+
+        self.start_time = time.monotonic()
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        self.progress_label.setText("Cleaning...")
+        self.button_cancel.setEnabled(True)
+        self.check_if_ready_to_clean()
+        self.worker.start()
+
+    def cancel_cleaning(self):
+        if self.worker is not None:
+            self.button_cancel.setEnabled(False)
+            self.progress_label.setText("Cancelling...")
+            self.worker.requestInterruption()
+
+    def update_progress(self, bytes_read, total):
+        self.progress_bar.setValue(int(bytes_read * 1000 / total) if total else 1000)
+        elapsed = time.monotonic() - self.start_time
+        if elapsed <= 0 or bytes_read <= 0:
+            return
+        speed = bytes_read / elapsed
+        eta = int((total - bytes_read) / speed)
+        self.progress_label.setText(
+            f"{bytes_read / 1e6:.0f}/{total / 1e6:.0f} MB - {speed / 1e6:.1f} MB/s - "
+            f"ETA {eta // 60}:{eta % 60:02d}")
+
+    def cleaning_succeeded(self, stats):
+        elapsed = max(stats["elapsed"], 1e-9)
+        points = stats.get("points", stats["rows_written"])
+        dropped = f", {stats['duplicates']} duplicates and {stats['spikes']} spikes dropped" \
+            if "duplicates" in stats else ""
+        self.progress_label.setText(
+            f"{stats['rows_written']} rows in {stats['elapsed']:.1f} s "
+            f"({points / elapsed:.0f} rows/s){dropped}")
+        QMessageBox.information(self, "Success", f"Cleaned data with ASL altitude saved to {self.output_file_path}!")
+
+    def folder_succeeded(self, results):
+        summary = format_batch_summary(results)
+        self.progress_label.setText(summary.splitlines()[-1])
+        box = QMessageBox(QMessageBox.Information, "Success", f"Cleaned {len(results)} files.", parent=self)
+        box.setDetailedText(summary)
+        box.exec_()
+
+    def cleaning_failed(self, message):
+        self.progress_label.setText("")
+        QMessageBox.critical(self, "Error", f"An error occurred: {message}")
+
+    def cleaning_cancelled(self):
+        self.progress_label.setText("Cleaning cancelled, output file left untouched.")
+
+    def cleaning_finished(self):
+        self.worker.deleteLater()
+        self.worker = None
+        self.progress_bar.hide()
+        self.button_cancel.setEnabled(False)
+        self.check_if_ready_to_clean()
+
+    def closeEvent(self, event):
+        # Interrompe un'eventuale pulizia in corso prima di chiudere
+        if self.worker is not None:
+            self.worker.requestInterruption()
+            self.worker.wait()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -0,0 +1,411 @@
+"""Benchmark del motore di Exif Eraser.
+
+Genera cartelle di JPEG e PNG sintetici (deterministici a parita' di
+parametri) con blocchi EXIF realistici (fotocamera, data, GPS, focale,
+orientamento, XMP, profilo colore), li elabora con at_exif_eraser_core in
+ogni modalita' e con ogni numero di processi e registra file/s, MB/s,
+megapixel/s, picco di memoria (RSS) e file aperti (anche in ogni processo
+del pool) in un file JSON. La tabella di confronto con una versione
+precedente si ottiene con:
+
+    python at_exif_eraser_bench.py --count 200 --workers 1 4 --output new.json
+    python at_exif_eraser_bench.py --count 200 --workers 1 4 --compare old.json --table bench.md
+
+Ogni misura gira in un processo separato, cosi' il picco di memoria e'
+quello della sola elaborazione. I file generati restano in ``--data-dir``
+e vengono riutilizzati.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: picco di memoria non disponibile
+    resource = None
+
+try:
+    from PIL import Image
+except ImportError:  # serve solo per generare le immagini
+    Image = None
+
+from at_exif_eraser_core import process_folder
+
+DEFAULT_COUNT = 200
+DEFAULT_IMAGE_SIZE = (2000, 1500)
+DEFAULT_WORKERS = [1, os.cpu_count() or 1]
+# Opzioni di process_folder per ogni modalita'; index e thumbnails vengono
+# risolte nella cartella di output
+MODES = {
+    "lossless": {},
+    "all_app": {"all_app": True},
+    "reencode": {"lossless": False},
+    "index": {"index_path": "exif_index.csv"},
+    "thumbnails": {"thumbnail_dir": "anteprime"},
+}
+FORMATS = {"jpeg": ".jpg", "png": ".png"}
+# Intervallo di campionamento dei file aperti nei processi del pool, in secondi
+FD_SAMPLE_INTERVAL = 0.01
+CAMERAS = [("GoPro", "HERO9 Black"), ("SONY", "ILCE-7RM3"), ("Blue Robotics", "Low-Light HD USB")]
+
+
+def synthetic_exif(rnd, index):
+    """Blocco EXIF simile a quello di una fotocamera su ROV, con GPS e focale."""
+    exif = Image.Exif()
+    make, model = rnd.choice(CAMERAS)
+    exif[0x010F] = make
+    exif[0x0110] = model
+    exif[0x0112] = rnd.choice([1, 1, 1, 3, 6, 8])
+    exif[0x0131] = "Arc-Team bench"
+    exif[0x0132] = f"2024:07:{1 + index % 28:02d} {index // 3600 % 24:02d}:{index // 60 % 60:02d}:{index % 60:02d}"
+    exif_ifd = exif.get_ifd(0x8769)
+    exif_ifd[0x9003] = exif[0x0132]
+    exif_ifd[0x920A] = rnd.choice([2.92, 3.0, 16.0, 24.0, 35.0])
+    exif_ifd[0x829A] = 1 / rnd.choice([60, 125, 250])
+    exif_ifd[0x8827] = rnd.choice([100, 400, 1600])
+    exif_ifd[0xA420] = f"{rnd.getrandbits(128):032x}"
+    gps = exif.get_ifd(0x8825)
+    lat, lon = 45.5 + rnd.random(), 11.0 + rnd.random()
+    for ref_tag, tag, value, refs in ((1, 2, lat, "NS"), (3, 4, lon, "EW")):
+        minutes = (value % 1) * 60
+        gps[ref_tag] = refs[0]
+        gps[tag] = (int(value), int(minutes), round((minutes % 1) * 60, 4))
+    gps[5] = b"\x01"  # sotto il livello del mare
+    gps[6] = round(rnd.uniform(2, 60), 2)
+    return exif
+
+
+def synthetic_image(rnd, width, height):
+    """Immagine con trama morbida e rumore, che si comprime come una foto vera."""
+    small = Image.frombytes("RGB", (max(width // 16, 1), max(height // 16, 1)),
+                            rnd.randbytes(max(width // 16, 1) * max(height // 16, 1) * 3))
+    image = small.resize((width, height), Image.BICUBIC)
+    noise = Image.frombytes("L", (width, height), rnd.randbytes(width * height))
+    return Image.blend(image, Image.merge("RGB", (noise, noise, noise)), 0.08)
+
+
+def generate_images(directory, count, fmt="jpeg", image_size=DEFAULT_IMAGE_SIZE, seed=0):
+    """Scrive in ``directory`` ``count`` immagini sintetiche con metadati."""
+    if Image is None:
+        raise RuntimeError("Generating benchmark images requires Pillow.")
+    rnd = random.Random(seed)
+    width, height = image_size
+    # Il contenuto si ripete ogni 8 immagini: la generazione resta veloce
+    images = [synthetic_image(rnd, width, height) for _ in range(min(count, 8))]
+    icc = rnd.randbytes(3144)  # dimensione tipica di un profilo sRGB
+    tmp_dir = f"{directory}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    for index in range(count):
+        exif = synthetic_exif(rnd, index).tobytes()
+        xmp = (f'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:Description '
+               f'exif:GPSLatitude="{rnd.uniform(45, 46):.6f}"/></x:xmpmeta>').encode()
+        path = os.path.join(tmp_dir, f"img_{index:05d}{FORMATS[fmt]}")
+        if fmt == "jpeg":
+            images[index % len(images)].save(path, quality=90, exif=exif, icc_profile=icc, xmp=xmp)
+        else:
+            images[index % len(images)].save(path, exif=exif, icc_profile=icc, compress_level=1)
+    os.replace(tmp_dir, directory)
+
+
+def dataset_path(data_dir, count, fmt, image_size, seed):
+    """Cartella generata (e riutilizzata) per una combinazione di parametri."""
+    path = os.path.join(data_dir, f"exif_{fmt}_{count}_{image_size[0]}x{image_size[1]}_seed{seed}")
+    if not os.path.isdir(path):
+        # In un altro processo: le immagini in memoria alzerebbero il picco
+        # di memoria ereditato dai processi di misura
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--generate", path, "--count", str(count),
+                        "--formats", fmt, "--image-size", str(image_size[0]), str(image_size[1]),
+                        "--seed", str(seed)], check=True)
+    return path
+
+
+def peak_rss(who=None):
+    """Picco di memoria residente in bytes (processo o figli), None se non disponibile."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux: KB
+
+
+def open_fds(pid=None):
+    """File aperti dal processo ``pid`` (di default quello corrente), None se il sistema non lo indica.
+
+    Per un altro processo si contano solo i file veri e propri, non pipe,
+    socket o dispositivi: sono quelli che resterebbero aperti per un'immagine
+    non chiusa.
+    """
+    if pid is not None:
+        fd_dir = f"/proc/{pid}/fd"
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            return None
+        count = 0
+        for fd in fds:
+            try:
+                target = os.readlink(os.path.join(fd_dir, fd))
+            except OSError:  # chiuso nel frattempo
+                continue
+            count += target.startswith("/") and not target.startswith("/dev/")
+        return count
+    for fd_dir in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(fd_dir)) - 1  # il descrittore della cartella stessa
+        except OSError:
+            continue
+    return None
+
+
+def child_pids():
+    """Processi figli del processo corrente (solo Linux, altrimenti insieme vuoto)."""
+    pids = set()
+    try:
+        tasks = os.listdir("/proc/self/task")
+    except OSError:
+        return pids
+    for task in tasks:
+        try:
+            with open(f"/proc/self/task/{task}/children", encoding="ascii") as infile:
+                pids.update(int(pid) for pid in infile.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+class WorkerFdSampler(threading.Thread):
+    """Campiona i file aperti da ogni processo del pool durante l'elaborazione.
+
+    Con piu' processi le immagini vengono aperte nei figli, non nel processo
+    di misura: il thread legge /proc/<pid>/fd di ogni figlio ogni
+    ``interval`` secondi e tiene i conteggi per processo.
+    """
+
+    def __init__(self, interval=FD_SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = {}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """Conta i file aperti in ogni figlio; restituisce il massimo di questo campione."""
+        counts = [(pid, open_fds(pid)) for pid in child_pids()]
+        for pid, count in counts:
+            if count is not None:
+                self.samples.setdefault(pid, []).append(count)
+        return max((count for _, count in counts if count is not None), default=None)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def peak(self):
+        """Massimo dei file aperti contemporaneamente in un singolo processo."""
+        return max((max(counts) for counts in self.samples.values()), default=None)
+
+    def leaked(self):
+        """File ancora aperti nel processo peggiore quando tutte le immagini sono finite.
+
+        Va chiamata a lavoro concluso ma con il pool ancora attivo: i processi
+        sono fermi, quindi ogni file che risulta aperto e' un descrittore perso.
+        """
+        return self.sample()
+
+
+def measure(input_dir, output_dir, mode, workers):
+    """Elabora ``input_dir`` nella modalita' ``mode`` e restituisce le misure.
+
+    I file aperti vengono contati prima, durante (a ogni avanzamento) e dopo
+    l'elaborazione: ``open_fds_leaked`` diverso da zero indica file non
+    chiusi. Con piu' processi le immagini vengono aperte nel pool, quindi
+    ``open_fds_workers_peak`` e ``open_fds_workers_leaked`` riportano il
+    picco e la crescita del processo del pool peggiore (vedi
+    WorkerFdSampler); anche il picco di memoria dei figli e' quello del
+    processo del pool piu' pesante.
+    """
+    options = {key: os.path.join(output_dir, value) if key in ("index_path", "thumbnail_dir") else value
+               for key, value in MODES[mode].items()}
+    fds_before = open_fds()
+    fds_peak = fds_before
+    sampler = WorkerFdSampler() if workers > 1 else None
+    workers_leaked = None
+
+    def progress(done, total, bytes_done):
+        nonlocal fds_peak, workers_leaked
+        if fds_before is not None:
+            fds_peak = max(fds_peak, open_fds())
+        if sampler and done == total:
+            workers_leaked = sampler.leaked()
+
+    pixels = 0
+    for name in os.listdir(input_dir):
+        with Image.open(os.path.join(input_dir, name)) as img:
+            pixels += img.width * img.height
+    if sampler:
+        sampler.start()
+    start = time.perf_counter()
+    try:
+        results = process_folder(input_dir, output_dir, workers=workers, progress=progress, **options)
+    finally:
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        if sampler:
+            sampler.stop()
+    fds_after = open_fds()
+    bytes_in = sum(result["bytes_in"] for result in results)
+    return {
+        "seconds": elapsed,
+        "files": len(results),
+        "failed": sum(1 for result in results if result["error"]),
+        "files_per_s": len(results) / elapsed,
+        "mb_per_s": bytes_in / 1e6 / elapsed,
+        "megapixels_per_s": pixels / 1e6 / elapsed,
+        "input_bytes": bytes_in,
+        "output_bytes": sum(result["bytes_out"] for result in results),
+        "peak_rss": peak_rss(),
+        "peak_rss_workers": peak_rss(resource.RUSAGE_CHILDREN) if resource and workers > 1 else None,
+        "open_fds_peak": fds_peak,
+        "open_fds_leaked": fds_after - fds_before if fds_before is not None else None,
+        "open_fds_workers_peak": sampler.peak() if sampler else None,
+        "open_fds_workers_leaked": workers_leaked,
+    }
+
+
+def run_isolated(input_dir, output_dir, mode, workers):
+    """Esegue ``measure`` in un nuovo interprete e ne legge il risultato JSON."""
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--measure", input_dir, output_dir, mode, str(workers)],
+        check=True, stdout=subprocess.PIPE, text=True)
+    return json.loads(result.stdout)
+
+
+def run_suite(count, formats, modes, workers_list, data_dir, image_size=DEFAULT_IMAGE_SIZE, seed=0,
+              repeat=1, log=None):
+    """Misura ogni modalita' con ogni numero di processi; tiene la ripetizione piu' veloce."""
+    results = []
+    for fmt in formats:
+        input_dir = dataset_path(data_dir, count, fmt, image_size, seed)
+        for mode in modes:
+            for workers in workers_list:
+                runs = []
+                for _ in range(repeat):
+                    # Cartella nuova a ogni ripetizione: nessuna immagine viene saltata
+                    with tempfile.TemporaryDirectory() as out_dir:
+                        runs.append(run_isolated(input_dir, out_dir, mode, workers))
+                best = min(runs, key=lambda run: run["seconds"])
+                best.update(format=fmt, mode=mode, workers=workers)
+                results.append(best)
+                if log:
+                    log(format_result(best))
+    return results
+
+
+def _megabytes(value):
+    return f"{value / 1e6:.0f} MB" if value is not None else "n/a"
+
+
+def format_result(result):
+    return (f"{result['format']:>4} {result['mode']:>10} x{result['workers']:<2}: "
+            f"{result['seconds']:7.2f} s {result['files_per_s']:8.1f} files/s "
+            f"{result['mb_per_s']:7.1f} MB/s {result['megapixels_per_s']:7.1f} MP/s "
+            f"peak RSS {_megabytes(result['peak_rss']):>7}, open files {result['open_fds_peak']}"
+            f" (per worker {result.get('open_fds_workers_peak')})")
+
+
+def comparison_table(results, baseline=None):
+    """Tabella Markdown dei risultati, con il rapporto di velocita' rispetto a ``baseline``."""
+    previous = {(item["format"], item["mode"], item["workers"]): item
+                for item in (baseline or {}).get("results", [])}
+    header = ["format", "mode", "workers", "files/s", "MB/s", "MP/s", "peak RSS", "workers RSS",
+              "open files", "leaked fds", "worker files", "worker leaked fds"]
+    if baseline:
+        header.append("vs baseline")
+    lines = ["| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+    for result in results:
+        row = [result["format"], result["mode"], str(result["workers"]), f"{result['files_per_s']:.1f}",
+               f"{result['mb_per_s']:.1f}", f"{result['megapixels_per_s']:.1f}",
+               _megabytes(result["peak_rss"]), _megabytes(result["peak_rss_workers"]),
+               str(result["open_fds_peak"]), str(result["open_fds_leaked"]),
+               str(result.get("open_fds_workers_peak")), str(result.get("open_fds_workers_leaked"))]
+        if baseline:
+            old = previous.get((result["format"], result["mode"], result["workers"]))
+            row.append(f"{result['files_per_s'] / old['files_per_s']:.2f}x" if old else "new")
+        lines.append("| " + " | ".join(row) + " |")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Exif Eraser engine (Arc-Team Tools).")
+    parser.add_argument("--count", type=int, default=DEFAULT_COUNT,
+                        help=f"images per generated set (default: {DEFAULT_COUNT})")
+    parser.add_argument("--image-size", type=int, nargs=2, default=list(DEFAULT_IMAGE_SIZE),
+                        metavar=("WIDTH", "HEIGHT"),
+                        help="size of the generated images (default: %d %d)" % DEFAULT_IMAGE_SIZE)
+    parser.add_argument("--formats", nargs="+", choices=list(FORMATS), default=list(FORMATS),
+                        help="image formats to generate (default: jpeg png)")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), metavar="MODE",
+                        default=["lossless", "reencode"],
+                        help=f"processing modes: {', '.join(MODES)} (default: lossless reencode)")
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted(set(DEFAULT_WORKERS)), metavar="N",
+                        help="worker process counts to benchmark (default: 1 and the CPU count)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the generator (default: 0)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per measure, the fastest is kept")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "exif_bench"),
+                        help="where generated image sets are kept and reused")
+    parser.add_argument("--output", metavar="JSON", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="JSON", help="compare with the results of a previous run")
+    parser.add_argument("--table", metavar="MD", help="write the comparison table to this Markdown file")
+    parser.add_argument("--generate", metavar="DIR",
+                        help="only write a synthetic set of the first --formats format and exit")
+    parser.add_argument("--measure", nargs=4, metavar=("INPUT", "OUTPUT", "MODE", "WORKERS"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        input_dir, output_dir, mode, workers = args.measure
+        print(json.dumps(measure(input_dir, output_dir, mode, int(workers))))
+        return 0
+    if Image is None:
+        parser.error("generating benchmark images requires Pillow")
+    if args.generate:
+        generate_images(args.generate, args.count, args.formats[0], tuple(args.image_size), args.seed)
+        return 0
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = run_suite(args.count, args.formats, args.modes, args.workers, args.data_dir,
+                        tuple(args.image_size), args.seed, args.repeat, log=print)
+    report = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "generator": {"count": args.count, "image_size": args.image_size, "seed": args.seed},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as outfile:
+            json.dump(report, outfile, indent=2)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as infile:
+            baseline = json.load(infile)
+    table = comparison_table(results, baseline)
+    print(table)
+    if args.table:
+        with open(args.table, "w", encoding="utf-8") as outfile:
+            outfile.write(table + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
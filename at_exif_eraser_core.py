@@ -0,0 +1,769 @@
+"""Motore di Exif Eraser, utilizzabile senza interfaccia grafica.
+
+I JPEG vengono ripuliti senza decodificarli: si scorrono i segmenti del file
+e si copiano byte per byte quelli dell'immagine (tabelle e dati compressi),
+scartando i segmenti APP1 (EXIF, XMP). Allo stesso modo nei PNG si copiano
+i chunk dell'immagine e si scartano quelli di metadati (eXIf, testo, data).
+I pixel restano identici e il lavoro e' limitato dalla velocita' del disco.
+In alternativa le immagini possono essere decodificate e risalvate con PIL.
+Puo' essere usato anche da riga di comando, ad esempio sul server dopo
+ogni immersione:
+
+    python at_exif_eraser_core.py /dati/immersione_12 -o /pulite/immersione_12 --skip-unchanged
+"""
+import argparse
+import contextlib
+import csv
+import glob
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import re
+import sqlite3
+import struct
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+try:
+    from PIL import Image
+except ImportError:  # PIL serve solo per la ricodifica
+    Image = None
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+JPEG_EXTENSIONS = (".jpg", ".jpeg")
+PNG_EXTENSIONS = (".png",)
+# File per ogni compito inviato al pool di processi
+BATCH_SIZE = 16
+# Intervallo (secondi) con cui il processo principale controlla l'annullamento
+CANCEL_POLL = 0.2
+# Manifest delle immagini gia' elaborate, nella cartella di destinazione
+MANIFEST_NAME = ".exif_eraser_manifest.csv"
+MANIFEST_HEADER = ["path", "size", "mtime_ns", "sha1", "settings"]
+HASH_BLOCK_SIZE = 1024 * 1024
+# Lato massimo delle anteprime in pixel
+THUMBNAIL_SIZE = 320
+# Aggiunto al nome completo dell'immagine: IMG_1.jpg e IMG_1.png non
+# producono la stessa anteprima
+THUMBNAIL_SUFFIX = ".jpg"
+
+# Marcatori JPEG
+SOI, EOI, SOS = 0xD8, 0xD9, 0xDA
+APP0, APP1, APP14, APP15, COM = 0xE0, 0xE1, 0xEE, 0xEF, 0xFE
+# Marcatori senza lunghezza: TEM e RST0-RST7
+STANDALONE = {0x01} | set(range(0xD0, 0xD8))
+# Fine dei dati compressi: 0xFF seguito da un byte diverso da 0x00 (byte
+# stuffing) e dai marcatori di restart
+_SCAN_END = re.compile(rb"\xff[^\x00\xd0-\xd7]")
+
+# Chunk PNG
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Metadati: EXIF, testo (anche XMP, in iTXt) e data di modifica
+PNG_METADATA_CHUNKS = {b"eXIf", b"tEXt", b"zTXt", b"iTXt", b"tIME"}
+# Con all_app anche il profilo colore, come per i JPEG
+PNG_OPTIONAL_CHUNKS = {b"iCCP"}
+
+# Indice dei metadati principali (index_path di process_folder)
+INDEX_FIELDS = ["file", "datetime", "latitude", "longitude", "altitude", "focal_length",
+                "orientation", "make", "model"]
+# Tag EXIF: IFD0, sotto-IFD Exif e GPS
+TAG_MAKE, TAG_MODEL, TAG_ORIENTATION, TAG_DATETIME = 0x010F, 0x0110, 0x0112, 0x0132
+TAG_EXIF_IFD, TAG_GPS_IFD = 0x8769, 0x8825
+TAG_DATETIME_ORIGINAL, TAG_FOCAL_LENGTH = 0x9003, 0x920A
+GPS_LATITUDE_REF, GPS_LATITUDE, GPS_LONGITUDE_REF, GPS_LONGITUDE = 1, 2, 3, 4
+GPS_ALTITUDE_REF, GPS_ALTITUDE = 5, 6
+# Tipi TIFF: formato struct di un valore e numero di byte
+TIFF_TYPES = {1: ("B", 1), 2: ("s", 1), 3: ("H", 2), 4: ("L", 4), 5: ("LL", 8), 6: ("b", 1),
+              7: ("B", 1), 8: ("h", 2), 9: ("l", 4), 10: ("ll", 8), 11: ("f", 4), 12: ("d", 8)}
+
+
+class InvalidImage(ValueError):
+    """Il file non ha la struttura attesa per il suo formato."""
+
+
+def _drop_segment(marker, all_app):
+    """True se il segmento con questo marcatore contiene solo metadati da eliminare.
+
+    APP1 contiene EXIF e XMP. Con ``all_app`` vengono eliminati anche gli
+    altri APPn (profilo ICC, IPTC di Photoshop...) e i commenti, ma non
+    APP0 (JFIF) e APP14 (Adobe), che servono per interpretare i colori.
+    """
+    if marker == APP1:
+        return True
+    return all_app and (APP0 < marker <= APP15 and marker != APP14 or marker == COM)
+
+
+def jpeg_segments(data, all_app=False, dropped=None):
+    """Parti di ``data`` (JPEG) da copiare nel file ripulito, come memoryview.
+
+    I dati compressi dopo ogni SOS vengono copiati senza decodificarli; tutto
+    quello che segue EOI (anteprime accodate da alcune fotocamere) viene
+    scartato. Se ``dropped`` e' una lista, vi vengono aggiunte le coppie
+    (marcatore, contenuto) dei segmenti eliminati. Solleva InvalidImage se
+    il file non e' un JPEG valido.
+    """
+    view = memoryview(data)
+    size = len(data)
+    if data[:2] != b"\xff\xd8":
+        raise InvalidImage("Not a JPEG file (missing SOI marker).")
+    parts = [view[:2]]
+    pos = 2
+    while True:
+        if pos >= size or data[pos] != 0xFF:
+            raise InvalidImage(f"Corrupt JPEG: expected a marker at byte {pos}.")
+        while pos + 1 < size and data[pos + 1] == 0xFF:
+            pos += 1  # Byte di riempimento prima del marcatore
+        if pos + 1 >= size:
+            raise InvalidImage("Corrupt JPEG: truncated marker.")
+        marker = data[pos + 1]
+        if marker == EOI:
+            parts.append(view[pos:pos + 2])
+            return parts
+        if marker in STANDALONE:
+            parts.append(view[pos:pos + 2])
+            pos += 2
+            continue
+        if pos + 4 > size:
+            raise InvalidImage("Corrupt JPEG: truncated segment header.")
+        end = pos + 2 + int.from_bytes(data[pos + 2:pos + 4], "big")
+        if end > size:
+            raise InvalidImage(f"Corrupt JPEG: segment at byte {pos} runs past the end of file.")
+        if marker == SOS:
+            match = _SCAN_END.search(data, end)
+            if match is None:
+                # File troncato senza EOI: si tengono comunque i dati compressi
+                parts.append(view[pos:])
+                return parts
+            end = match.start()
+        if not _drop_segment(marker, all_app):
+            parts.append(view[pos:end])
+        elif dropped is not None:
+            dropped.append((marker, view[pos + 4:end]))
+        pos = end
+
+
+def strip_jpeg(input_path, output_path, all_app=False, metadata=None):
+    """Copia ``input_path`` in ``output_path`` senza metadati, senza ricodificare.
+
+    Se ``metadata`` e' un dizionario, vi vengono aggiunti i campi EXIF
+    principali (parse_exif) letti dai segmenti eliminati. Restituisce
+    (bytes letti, bytes scritti).
+    """
+    with open(input_path, "rb") as infile:
+        data = infile.read()
+    dropped = [] if metadata is not None else None
+    parts = jpeg_segments(data, all_app, dropped)
+    for marker, content in dropped or ():
+        if marker == APP1 and content[:6] == b"Exif\0\0":
+            metadata.update(parse_exif(content[6:]))
+            break
+    _write_atomic(output_path, parts)
+    return len(data), sum(len(part) for part in parts)
+
+
+def png_chunks(data, all_app=False, dropped=None):
+    """Intervalli (inizio, fine) dei chunk di ``data`` (PNG) da copiare.
+
+    I chunk di immagine (IHDR, PLTE, IDAT, IEND...) e quelli che servono per
+    visualizzarla (trasparenza, gamma...) vengono tenuti senza decomprimere
+    nulla; vengono scartati i chunk di PNG_METADATA_CHUNKS (e, con
+    ``all_app``, PNG_OPTIONAL_CHUNKS) e quanto segue IEND. Se ``dropped``
+    e' una lista, vi vengono aggiunte le coppie (tipo, (inizio, fine) dei
+    dati) dei chunk eliminati. Solleva InvalidImage se il file non e' un PNG
+    valido.
+    """
+    size = len(data)
+    if data[:8] != PNG_SIGNATURE:
+        raise InvalidImage("Not a PNG file (missing signature).")
+    drop = PNG_METADATA_CHUNKS | PNG_OPTIONAL_CHUNKS if all_app else PNG_METADATA_CHUNKS
+    ranges = [(0, 8)]
+    pos = 8
+    while True:
+        if pos + 8 > size:
+            raise InvalidImage("Corrupt PNG: missing IEND chunk.")
+        # Lunghezza dei dati + tipo + dati + CRC
+        end = pos + 12 + int.from_bytes(data[pos:pos + 4], "big")
+        chunk_type = data[pos + 4:pos + 8]
+        if end > size:
+            raise InvalidImage(f"Corrupt PNG: chunk at byte {pos} runs past the end of file.")
+        if chunk_type not in drop:
+            if ranges[-1][1] == pos:
+                ranges[-1] = (ranges[-1][0], end)  # Chunk consecutivi: un'unica copia
+            else:
+                ranges.append((pos, end))
+        elif dropped is not None:
+            dropped.append((chunk_type, (pos + 8, end - 4)))
+        if chunk_type == b"IEND":
+            return ranges
+        pos = end
+
+
+def strip_png(input_path, output_path, all_app=False, metadata=None):
+    """Copia ``input_path`` in ``output_path`` senza i chunk di metadati.
+
+    Il file viene mappato in memoria, quindi anche i mosaici molto grandi
+    vengono copiati senza caricarli interamente. ``metadata`` come in
+    strip_jpeg (chunk eXIf). Restituisce (bytes letti, bytes scritti).
+    """
+    with open(input_path, "rb") as infile:
+        if not os.fstat(infile.fileno()).st_size:
+            raise InvalidImage("Not a PNG file (empty file).")
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            dropped = [] if metadata is not None else None
+            ranges = png_chunks(data, all_app, dropped)
+            for chunk_type, (start, end) in dropped or ():
+                if chunk_type == b"eXIf":
+                    metadata.update(parse_exif(data[start:end]))
+                    break
+            with memoryview(data) as view:
+                _write_atomic(output_path, (view[start:end] for start, end in ranges))
+            return len(data), sum(end - start for start, end in ranges)
+
+
+def reencode_image(input_path, output_path, metadata=None):
+    """Decodifica l'immagine e la risalva senza metadati, nello stesso formato.
+
+    I JPEG vengono ricompressi (con perdita) a qualita' 100, i PNG risalvati
+    come PNG. ``metadata`` come in strip_jpeg.
+    """
+    if Image is None:
+        raise RuntimeError("Re-encoding images requires Pillow (pip install pillow).")
+    with Image.open(input_path) as img:
+        if metadata is not None and img.info.get("exif"):
+            exif = img.info["exif"]
+            metadata.update(parse_exif(exif[6:] if exif[:6] == b"Exif\0\0" else exif))
+        # Salvando senza passare l'argomento 'exif', i dati vengono eliminati
+        with _atomic_path(output_path) as tmp_path:
+            if img.format == "PNG":
+                img.save(tmp_path, 'PNG', optimize=True)
+            else:
+                img.save(tmp_path, 'JPEG', optimize=True, quality=100)
+    return os.path.getsize(input_path), os.path.getsize(output_path)
+
+
+@contextlib.contextmanager
+def _atomic_path(path):
+    """Restituisce un percorso temporaneo che alla fine del blocco sostituisce ``path``.
+
+    Se il blocco fallisce il file temporaneo viene rimosso e ``path`` resta
+    com'era: nessun file a meta' anche se il processo viene interrotto.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_atomic(output_path, parts):
+    with _atomic_path(output_path) as tmp_path, open(tmp_path, "wb") as outfile:
+        outfile.writelines(parts)
+
+
+def _read_ifd(tiff, order, offset):
+    """Voci di una IFD TIFF: tag -> valore (tupla, stringa o numero)."""
+    entries = {}
+    count, = struct.unpack_from(order + "H", tiff, offset)
+    for i in range(count):
+        tag, kind, n, value_offset = struct.unpack_from(order + "HHLL", tiff, offset + 2 + 12 * i)
+        if kind not in TIFF_TYPES:
+            continue
+        fmt, size = TIFF_TYPES[kind]
+        start = offset + 10 + 12 * i if size * n <= 4 else value_offset
+        if start + size * n > len(tiff):
+            continue
+        if kind == 2:
+            entries[tag] = bytes(tiff[start:start + n]).split(b"\0", 1)[0].decode("latin-1").strip()
+            continue
+        values = struct.unpack_from(order + fmt * n, tiff, start)
+        if len(fmt) == 2:  # Razionali: numeratore/denominatore
+            values = tuple(num / den if den else float("nan") for num, den in zip(values[::2], values[1::2]))
+        entries[tag] = values[0] if n == 1 else values
+    return entries
+
+
+def _degrees(dms, ref):
+    degrees = dms[0] + dms[1] / 60 + dms[2] / 3600
+    return -degrees if ref in ("S", "W") else degrees
+
+
+def parse_exif(tiff):
+    """Campi principali (INDEX_FIELDS) di un blocco EXIF in formato TIFF.
+
+    Legge solo IFD0 e le sotto-IFD Exif e GPS; i campi mancanti o illeggibili
+    vengono omessi, un blocco non valido da' un dizionario vuoto.
+    """
+    order = {b"II": "<", b"MM": ">"}.get(bytes(tiff[:2]))
+    fields = {}
+    if order is None:
+        return fields
+    try:
+        ifd0 = _read_ifd(tiff, order, struct.unpack_from(order + "L", tiff, 4)[0])
+        exif = _read_ifd(tiff, order, ifd0[TAG_EXIF_IFD]) if isinstance(ifd0.get(TAG_EXIF_IFD), int) else {}
+        gps = _read_ifd(tiff, order, ifd0[TAG_GPS_IFD]) if isinstance(ifd0.get(TAG_GPS_IFD), int) else {}
+    except struct.error:
+        return fields
+    for field, value in (("datetime", exif.get(TAG_DATETIME_ORIGINAL, ifd0.get(TAG_DATETIME))),
+                         ("focal_length", exif.get(TAG_FOCAL_LENGTH)),
+                         ("orientation", ifd0.get(TAG_ORIENTATION)),
+                         ("make", ifd0.get(TAG_MAKE)), ("model", ifd0.get(TAG_MODEL))):
+        if value is not None and not isinstance(value, tuple):
+            fields[field] = value
+    for field, tag, ref in (("latitude", GPS_LATITUDE, GPS_LATITUDE_REF),
+                            ("longitude", GPS_LONGITUDE, GPS_LONGITUDE_REF)):
+        if isinstance(gps.get(tag), tuple) and len(gps[tag]) == 3:
+            fields[field] = _degrees(gps[tag], gps.get(ref))
+    if isinstance(gps.get(GPS_ALTITUDE), float):
+        fields["altitude"] = -gps[GPS_ALTITUDE] if gps.get(GPS_ALTITUDE_REF) == 1 else gps[GPS_ALTITUDE]
+    return fields
+
+
+def write_index(path, rows):
+    """Aggiunge o aggiorna le righe (dizionari con INDEX_FIELDS) nell'indice ``path``.
+
+    L'indice e' un database SQLite se ``path`` termina con .db, .sqlite o
+    .sqlite3 (tabella ``exif``, chiave ``file``), altrimenti un CSV.
+    """
+    if path.lower().endswith((".db", ".sqlite", ".sqlite3")):
+        with sqlite3.connect(path) as db:
+            db.execute("CREATE TABLE IF NOT EXISTS exif (file TEXT PRIMARY KEY, datetime TEXT, "
+                       "latitude REAL, longitude REAL, altitude REAL, focal_length REAL, "
+                       "orientation INTEGER, make TEXT, model TEXT)")
+            db.executemany(f"INSERT OR REPLACE INTO exif VALUES ({', '.join('?' * len(INDEX_FIELDS))})",
+                           [[row.get(field) for field in INDEX_FIELDS] for row in rows])
+        db.close()
+        return
+    entries = {}
+    if os.path.exists(path):
+        with open(path, newline="", encoding="utf-8") as infile:
+            entries = {row["file"]: row for row in csv.DictReader(infile)}
+    entries.update((row["file"], row) for row in rows)
+    with _atomic_path(path) as tmp_path, open(tmp_path, "w", newline="", encoding="utf-8") as outfile:
+        writer = csv.DictWriter(outfile, INDEX_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(entries[name] for name in sorted(entries))
+
+
+def make_thumbnail(input_path, output_path, size=THUMBNAIL_SIZE):
+    """Salva in ``output_path`` un'anteprima JPEG (lato massimo ``size``) senza metadati.
+
+    Per i JPEG si usa la decodifica ridotta di PIL (draft), che scala i
+    blocchi DCT a 1/2, 1/4 o 1/8 durante la decodifica: memoria e tempo
+    dipendono dalla dimensione dell'anteprima e non da quella della foto.
+    """
+    if Image is None:
+        raise RuntimeError("Thumbnails require Pillow (pip install pillow).")
+    with Image.open(input_path) as img:
+        img.draft("RGB", (size, size))
+        thumb = img.convert("RGB")
+    thumb.thumbnail((size, size))
+    with _atomic_path(output_path) as tmp_path:
+        thumb.save(tmp_path, "JPEG", quality=85)
+
+
+def process_image(input_path, output_path, lossless=True, all_app=False, metadata=None):
+    """Elimina i metadati da un'immagine; restituisce (bytes letti, bytes scritti).
+
+    Con ``lossless=True`` JPEG e PNG vengono ripuliti a livello di
+    segmenti/chunk (strip_jpeg, strip_png); con ``lossless=False`` vengono
+    ricodificati con PIL. Se ``metadata`` e' un dizionario, vi vengono
+    aggiunti i campi EXIF principali letti durante la stessa elaborazione.
+    """
+    if lossless and input_path.lower().endswith(JPEG_EXTENSIONS):
+        return strip_jpeg(input_path, output_path, all_app, metadata)
+    if lossless and input_path.lower().endswith(PNG_EXTENSIONS):
+        return strip_png(input_path, output_path, all_app, metadata)
+    return reencode_image(input_path, output_path, metadata)
+
+
+def scan_images(input_dir, relative="", exclude=()):
+    """Immagini supportate di ``input_dir`` e delle sue sottocartelle.
+
+    Restituisce terne (percorso relativo, dimensione, mtime in ns), in ordine
+    alfabetico per cartella. Usa os.scandir, che su Windows fornisce
+    dimensione e data senza una chiamata stat per file. Le cartelle in
+    ``exclude`` (ad esempio destinazione e anteprime, se stanno dentro
+    ``input_dir``) non vengono visitate.
+    """
+    exclude = {os.path.realpath(path) for path in exclude if path}
+    with os.scandir(os.path.join(input_dir, relative)) as entries:
+        entries = sorted(entries, key=lambda entry: entry.name)
+    for entry in entries:
+        path = os.path.join(relative, entry.name)
+        if entry.is_dir():
+            if os.path.realpath(entry.path) not in exclude:
+                yield from scan_images(input_dir, path, exclude)
+        elif entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS):
+            stat = entry.stat()
+            yield path, stat.st_size, stat.st_mtime_ns
+
+
+def find_images(input_dir):
+    """Percorsi (relativi) delle immagini supportate in ``input_dir``, sottocartelle comprese."""
+    return [path for path, _, _ in scan_images(input_dir)]
+
+
+def file_hash(path):
+    """SHA-1 del contenuto di un file."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as infile:
+        for block in iter(lambda: infile.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_manifest(path):
+    """Manifest di un'elaborazione precedente: percorso -> (dimensione, mtime, sha1, opzioni)."""
+    entries = {}
+    try:
+        with open(path, newline="", encoding="utf-8") as infile:
+            reader = csv.reader(infile)
+            if next(reader, None) != MANIFEST_HEADER:
+                return entries  # Formato sconosciuto: si rielabora tutto
+            for name, size, mtime_ns, sha1, settings in reader:
+                entries[name] = (int(size), int(mtime_ns), sha1, settings)
+    except (OSError, ValueError):
+        return {}
+    return entries
+
+
+def write_manifest(path, entries):
+    """Scrive il manifest (atomicamente) con le voci ordinate per percorso."""
+    with _atomic_path(path) as tmp_path, open(tmp_path, "w", newline="", encoding="utf-8") as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(MANIFEST_HEADER)
+        writer.writerows([name, *entry] for name, entry in sorted(entries.items()))
+
+
+class ProcessingCancelled(Exception):
+    """Sollevata quando l'elaborazione viene interrotta dall'utente."""
+
+
+# Evento di annullamento condiviso con i processi del pool (impostato da _init_worker)
+_cancel_event = None
+
+
+def _init_worker(cancel_event):
+    global _cancel_event
+    _cancel_event = cancel_event
+
+
+def _process_batch(jobs, options, hash_files=False, index=False, thumbnail_size=THUMBNAIL_SIZE):
+    """Elabora un gruppo di immagini; gli errori vengono registrati per file.
+
+    Eseguita nei processi del pool: deve restare a livello di modulo. Se
+    l'evento di annullamento e' impostato si ferma tra un file e l'altro e
+    restituisce solo i risultati dei file gia' completati.
+    """
+    results = []
+    for name, input_path, output_path, thumbnail_path in jobs:
+        if _cancel_event is not None and _cancel_event.is_set():
+            break
+        result = {"file": name, "bytes_in": 0, "bytes_out": 0, "error": None, "skipped": False,
+                  "sha1": "", "metadata": {} if index else None}
+        try:
+            result["bytes_in"], result["bytes_out"] = process_image(
+                input_path, output_path, metadata=result["metadata"], **options)
+            if thumbnail_path:
+                # Il file e' appena stato letto: l'anteprima non costa altro I/O dal disco
+                make_thumbnail(input_path, thumbnail_path, thumbnail_size)
+            if hash_files:
+                result["sha1"] = file_hash(input_path)
+        except Exception as e:
+            result["error"] = str(e) or type(e).__name__
+        results.append(result)
+    return results
+
+
+def _unchanged(size, mtime_ns, previous, settings, input_path, output_path, hash_files):
+    """True se l'immagine e' gia' stata elaborata con le stesse opzioni e non e' cambiata."""
+    if previous is None or previous[3] != settings or previous[0] != size or not os.path.exists(output_path):
+        return False
+    if previous[1] == mtime_ns:
+        return True
+    # Data cambiata (ad esempio una nuova copia): decide il contenuto
+    return hash_files and bool(previous[2]) and file_hash(input_path) == previous[2]
+
+
+def process_folder(input_dir, output_dir, **options):
+    """Elimina i metadati da tutte le immagini di ``input_dir``, sottocartelle comprese.
+
+    Le sottocartelle vengono riprodotte in ``output_dir``; le opzioni sono
+    quelle di process_files. Se ``output_dir`` o la cartella delle anteprime
+    stanno dentro ``input_dir`` vengono saltate, altrimenti ogni nuova
+    esecuzione ne rielaborerebbe il contenuto.
+    """
+    exclude = (output_dir, options.get("thumbnail_dir"))
+    files = [(name, os.path.join(input_dir, name), size, mtime_ns)
+             for name, size, mtime_ns in scan_images(input_dir, exclude=exclude)]
+    return process_files(files, output_dir, **options)
+
+
+def process_files(files, output_dir, workers=None, batch_size=BATCH_SIZE, progress=None,
+                  should_cancel=None, skip_unchanged=False, hash_files=False, index_path=None,
+                  thumbnail_dir=None, thumbnail_size=THUMBNAIL_SIZE, **options):
+    """Elimina i metadati dalle immagini ``files``, in parallelo.
+
+    ``files`` contiene quaterne (percorso relativo dell'output, percorso
+    dell'immagine, dimensione, mtime in ns) con percorsi di output diversi. Le
+    immagini vengono inviate a ``workers`` processi (di default uno per
+    core; con 1 tutto avviene nel processo corrente) a gruppi di
+    ``batch_size`` file. ``progress`` riceve (file completati, file da
+    elaborare, bytes letti) dopo ogni file o, con il pool, dopo ogni gruppo;
+    se ``should_cancel`` restituisce True i gruppi non ancora iniziati
+    vengono annullati, quelli in corso si fermano alla fine del file attuale
+    e si solleva ProcessingCancelled. Le altre opzioni vengono passate a
+    process_image.
+
+    In ``output_dir`` viene tenuto un manifest (MANIFEST_NAME) con percorso,
+    dimensione, data di modifica e, con ``hash_files``, SHA-1 di ogni
+    immagine elaborata: con ``skip_unchanged`` le immagini invariate dalla
+    volta precedente vengono saltate. Con ``index_path`` i campi EXIF
+    principali delle immagini elaborate, letti durante la stessa passata,
+    vengono salvati in un indice CSV o SQLite (write_index). Con
+    ``thumbnail_dir`` lo stesso processo salva anche un'anteprima JPEG di
+    ogni immagine (make_thumbnail), nella stessa struttura di cartelle e con
+    il nome completo seguito da THUMBNAIL_SUFFIX (IMG_1.png.jpg).
+    Restituisce un risultato per file (nome, bytes letti e scritti, errore o
+    None, saltato), nell'ordine di ``files``.
+    """
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = read_manifest(manifest_path)
+    settings = ";".join(f"{key}={value}" for key, value in sorted(options.items()))
+    if index_path:
+        settings += f";index={index_path}"  # Le immagini saltate devono essere gia' nell'indice
+    if thumbnail_dir:
+        settings += f";thumbnails={thumbnail_dir},{thumbnail_size},{THUMBNAIL_SUFFIX}"
+    results = {}
+    jobs = []
+    for name, input_path, size, mtime_ns in files:
+        key = name.replace(os.sep, "/")
+        output_path = os.path.join(output_dir, name)
+        if skip_unchanged and _unchanged(size, mtime_ns, manifest.get(key), settings, input_path,
+                                         output_path, hash_files):
+            results[name] = {"file": name, "bytes_in": 0, "bytes_out": 0, "error": None, "skipped": True}
+            manifest[key] = (size, mtime_ns) + manifest[key][2:]
+        else:
+            thumbnail_path = os.path.join(thumbnail_dir, name + THUMBNAIL_SUFFIX) if thumbnail_dir else None
+            jobs.append((name, input_path, output_path, thumbnail_path))
+    for directory in {os.path.dirname(path) for job in jobs for path in job[2:] if path}:
+        os.makedirs(directory, exist_ok=True)
+    stats = {name: (size, mtime_ns) for name, _, size, mtime_ns in files}
+    batches = [jobs[i:i + batch_size] for i in range(0, len(jobs), batch_size)]
+    index_rows = []
+    done = 0
+    bytes_done = 0
+
+    def collect(batch_results):
+        nonlocal done, bytes_done
+        for result in batch_results:
+            name = result["file"]
+            results[name] = result
+            done += 1
+            bytes_done += result["bytes_in"]
+            metadata = result.pop("metadata")
+            if not result["error"]:
+                manifest[name.replace(os.sep, "/")] = stats[name] + (result.pop("sha1"), settings)
+                if index_path:
+                    index_rows.append(dict(metadata, file=name.replace(os.sep, "/")))
+        if progress:
+            progress(done, len(jobs), bytes_done)
+
+    workers = workers or os.cpu_count() or 1
+    try:
+        if workers == 1:
+            for job in jobs:
+                if should_cancel and should_cancel():
+                    raise ProcessingCancelled()
+                collect(_process_batch([job], options, hash_files, bool(index_path), thumbnail_size))
+        else:
+            cancel_event = multiprocessing.Event()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(cancel_event,)) as pool:
+                pending = {pool.submit(_process_batch, batch, options, hash_files, bool(index_path),
+                                       thumbnail_size) for batch in batches}
+                while pending:
+                    # Attesa a intervalli brevi: l'annullamento non aspetta la fine di un gruppo
+                    finished, pending = wait(pending, timeout=CANCEL_POLL, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        if not future.cancelled():
+                            collect(future.result())
+                    if should_cancel and not cancel_event.is_set() and should_cancel():
+                        # I gruppi in corso restituiscono i file gia' completati,
+                        # che finiscono comunque nel manifest
+                        cancel_event.set()
+                        for future in pending:
+                            future.cancel()
+            if cancel_event.is_set():
+                raise ProcessingCancelled()
+    finally:
+        # Anche dopo un annullamento: le immagini gia' elaborate non si rifanno
+        if jobs or manifest:
+            os.makedirs(output_dir, exist_ok=True)
+            write_manifest(manifest_path, manifest)
+        if index_rows:
+            write_index(index_path, index_rows)
+    return [results[name] for name, _, _, _ in files]
+
+
+def format_summary(results):
+    """Riepilogo di ``process_folder``: totali ed elenco dei file non elaborati."""
+    failed = [result for result in results if result["error"]]
+    skipped = sum(1 for result in results if result.get("skipped"))
+    lines = [f"Immagini elaborate: {len(results) - len(failed) - skipped} su {len(results)}"
+             + (f" ({skipped} invariate, saltate)" if skipped else ""),
+             f"Dati letti: {sum(result['bytes_in'] for result in results) / 1e6:.1f} MB, "
+             f"scritti: {sum(result['bytes_out'] for result in results) / 1e6:.1f} MB"]
+    if failed:
+        lines.append(f"Errori ({len(failed)}):")
+        lines.extend(f"{result['file']}: {result['error']}" for result in failed)
+    return "\n".join(lines)
+
+
+def collect_images(sources, stdin=None, exclude=()):
+    """Immagini indicate da ``sources`` come quaterne per process_files.
+
+    Ogni sorgente puo' essere una cartella (letta ricorsivamente, con le
+    sottocartelle riprodotte nell'output e senza le cartelle ``exclude``),
+    un file, un pattern glob (``**`` per le sottocartelle) oppure ``-`` per
+    un elenco di file, uno per riga, letto da ``stdin``. I file indicati
+    singolarmente finiscono nella cartella di output con il solo nome; in
+    caso di nomi ripetuti vale il primo. Restituisce (immagini, risultati
+    in errore nel formato di process_files): un percorso indicato (non
+    glob) inesistente o che non e' un'immagine supportata e un'immagine con
+    un nome gia' presente finiscono nel riepilogo come errori invece di
+    sparire.
+    """
+    files = []
+    seen = set()
+    listed = set()
+    failures = []
+    excluded = tuple(os.path.join(os.path.realpath(folder), "") for folder in exclude if folder)
+
+    def fail(input_path, error):
+        failures.append({"file": input_path, "bytes_in": 0, "bytes_out": 0, "error": error, "skipped": False})
+
+    def first_listing(input_path):
+        # Lo stesso file indicato da piu' sorgenti viene considerato una volta sola
+        path_key = os.path.normcase(os.path.abspath(input_path))
+        if path_key in listed:
+            return False
+        listed.add(path_key)
+        return True
+
+    def add(name, input_path, size=None, mtime_ns=None):
+        if not first_listing(input_path):
+            return
+        if name in seen:
+            fail(input_path, f"an image named {name} is already in the list")
+            return
+        if size is None:
+            try:
+                stat = os.stat(input_path)
+            except OSError as e:
+                # Un percorso non piu' valido non blocca gli altri: finisce nel riepilogo
+                fail(input_path, e.strerror or str(e))
+                return
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+        seen.add(name)
+        files.append((name, input_path, size, mtime_ns))
+
+    for source in sources:
+        if source == "-":
+            paths = [line.strip() for line in (stdin or sys.stdin) if line.strip()]
+        elif os.path.isdir(source):
+            for name, size, mtime_ns in scan_images(source, exclude=exclude):
+                add(name, os.path.join(source, name), size, mtime_ns)
+            continue
+        elif glob.has_magic(source):
+            # Solo le immagini trovate: il glob puo' includere anche altri file
+            for path in sorted(glob.glob(source, recursive=True)):
+                if (os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS)
+                        and not os.path.realpath(path).startswith(excluded)):
+                    add(os.path.basename(path), path)
+            continue
+        else:
+            paths = [source]
+        for path in paths:
+            if path.lower().endswith(IMAGE_EXTENSIONS) or not os.path.exists(path):
+                add(os.path.basename(path), path)
+            elif first_listing(path):
+                fail(path, "not a JPEG or PNG image")
+    return files, failures
+
+
+def summary_json(results, elapsed):
+    """Riepilogo per il monitoraggio: file, bytes, tempo, velocita' ed errori."""
+    failures = [{"file": result["file"], "error": result["error"]} for result in results if result["error"]]
+    skipped = sum(1 for result in results if result.get("skipped"))
+    bytes_in = sum(result["bytes_in"] for result in results)
+    processed = len(results) - len(failures) - skipped
+    elapsed = max(elapsed, 1e-9)
+    return {
+        "files": len(results),
+        "processed": processed,
+        "skipped": skipped,
+        "failed": len(failures),
+        "bytes_in": bytes_in,
+        "bytes_out": sum(result["bytes_out"] for result in results),
+        "elapsed": round(elapsed, 3),
+        "files_per_s": round(processed / elapsed, 2),
+        "mb_per_s": round(bytes_in / 1e6 / elapsed, 2),
+        "failures": failures,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Remove EXIF and other metadata from JPEG/PNG images (Arc-Team Tools).")
+    parser.add_argument("inputs", nargs="+",
+                        help="folders (scanned recursively), image files, glob patterns "
+                             "(quote them, use ** for subfolders) or - to read file paths from stdin")
+    parser.add_argument("-o", "--output", required=True, help="destination folder")
+    parser.add_argument("--workers", type=int, metavar="N",
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument("--reencode", action="store_true",
+                        help="decode and re-save images with PIL instead of the lossless metadata-only mode")
+    parser.add_argument("--all-metadata", action="store_true",
+                        help="also remove ICC profiles, IPTC and comments")
+    parser.add_argument("--skip-unchanged", action="store_true",
+                        help="skip images already processed and unchanged since the last run")
+    parser.add_argument("--hash", action="store_true",
+                        help="store content hashes in the manifest, so re-copied but identical files are skipped")
+    parser.add_argument("--index", metavar="PATH",
+                        help="save date, GPS, focal length and orientation to a CSV or SQLite (.db/.sqlite) index")
+    parser.add_argument("--thumbnails", metavar="DIR", help="also write JPEG previews to DIR")
+    parser.add_argument("--thumbnail-size", type=int, default=THUMBNAIL_SIZE, metavar="PX",
+                        help=f"longest side of the previews (default: {THUMBNAIL_SIZE})")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        files, rejected = collect_images(args.inputs, exclude=(args.output, args.thumbnails))
+        for result in rejected:
+            print(f"Skipped {result['file']}: {result['error']}.", file=sys.stderr)
+        results = process_files(
+            files, args.output, workers=args.workers, skip_unchanged=args.skip_unchanged,
+            hash_files=args.hash, index_path=args.index, thumbnail_dir=args.thumbnails,
+            thumbnail_size=args.thumbnail_size, lossless=not args.reencode, all_app=args.all_metadata,
+            progress=lambda done, total, _: print(f"\r{done}/{total} images", end="", file=sys.stderr))
+        print(file=sys.stderr)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print("Cancelled.", file=sys.stderr)
+        return 130
+
+    summary = summary_json(rejected + results, time.perf_counter() - start)
+    print(json.dumps(summary, indent=2))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
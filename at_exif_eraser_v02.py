@@ -1,10 +1,41 @@
 import sys
 import os
+import time
+from functools import partial
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QFileDialog,
                              QLabel, QVBoxLayout, QWidget, QMessageBox, QStatusBar,
-                             QHBoxLayout)
+                             QHBoxLayout, QCheckBox, QSpinBox, QProgressBar)
+from PyQt5.QtCore import QThread, pyqtSignal
 from PyQt5.QtGui import QIcon, QPixmap
-from PIL import Image
+
+from at_exif_eraser_core import THUMBNAIL_SIZE, ProcessingCancelled, format_summary, process_folder
+
+INDEX_NAME = "exif_index.csv"
+THUMBNAIL_DIR = "anteprime"
+
+
+class EraserWorker(QThread):
+    """Esegue process_folder fuori dal thread della GUI."""
+    # object invece di int: i byte letti superano presto il limite di un int C++
+    progress = pyqtSignal(object, object, object)
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, job, parent=None):
+        super().__init__(parent)
+        self.job = job
+
+    def run(self):
+        try:
+            results = self.job(progress=self.progress.emit, should_cancel=self.isInterruptionRequested)
+        except ProcessingCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.succeeded.emit(results)
+
 
 class ExifEraserApp(QMainWindow):
     def __init__(self):
@@ -39,7 +70,7 @@ class ExifEraserApp(QMainWindow):
         layout.addSpacing(20)
 
         # Selezione Cartella Input
-        self.label_input = QLabel("Cartella Foto Originali (con EXIF):")
+        self.label_input = QLabel("Cartella Foto Originali (con EXIF, anche sottocartelle):")
         layout.addWidget(self.label_input)
         self.button_select_input = QPushButton("Seleziona Cartella Sorgente")
         self.button_select_input.clicked.connect(self.open_input_dir_dialog)
@@ -54,7 +85,39 @@ class ExifEraserApp(QMainWindow):
         self.button_select_output.clicked.connect(self.open_output_dir_dialog)
         layout.addWidget(self.button_select_output)
 
-        layout.addSpacing(20)
+        layout.addSpacing(10)
+
+        # Modalita' senza perdita: i JPEG non vengono ricodificati
+        self.check_lossless = QCheckBox("Solo metadati, senza ricodificare i JPEG (pixel identici)")
+        self.check_lossless.setChecked(True)
+        layout.addWidget(self.check_lossless)
+        self.check_all_app = QCheckBox("Rimuovi anche profilo colore, IPTC e commenti")
+        layout.addWidget(self.check_all_app)
+
+        # Le immagini gia' elaborate (manifest nella destinazione) vengono saltate
+        self.check_skip = QCheckBox("Salta le immagini gia' elaborate e non modificate")
+        self.check_skip.setChecked(True)
+        layout.addWidget(self.check_skip)
+        self.check_hash = QCheckBox("Confronta anche il contenuto (hash, piu' lento)")
+        layout.addWidget(self.check_hash)
+
+        # Data, GPS, focale e orientamento salvati prima di eliminarli
+        self.check_index = QCheckBox(f"Salva i dati EXIF principali in {INDEX_NAME} (destinazione)")
+        layout.addWidget(self.check_index)
+        self.check_thumbnails = QCheckBox(f"Crea anteprime ({THUMBNAIL_SIZE} px) in {THUMBNAIL_DIR}/ (destinazione)")
+        layout.addWidget(self.check_thumbnails)
+
+        # Numero di processi in parallelo (uno per core di default)
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(QLabel("Processi paralleli:"))
+        self.spin_workers = QSpinBox()
+        self.spin_workers.setRange(1, 64)
+        self.spin_workers.setValue(os.cpu_count() or 1)
+        workers_layout.addWidget(self.spin_workers)
+        workers_layout.addStretch()
+        layout.addLayout(workers_layout)
+
+        layout.addSpacing(10)
 
         # Bottone Esegui
         self.button_run = QPushButton("Rimuovi Metadati EXIF")
@@ -63,6 +126,11 @@ class ExifEraserApp(QMainWindow):
         self.button_run.setEnabled(False)
         layout.addWidget(self.button_run)
 
+        self.button_cancel = QPushButton("Annulla")
+        self.button_cancel.clicked.connect(self.cancel_processing)
+        self.button_cancel.setEnabled(False)
+        layout.addWidget(self.button_cancel)
+
         container = QWidget()
         container.setLayout(layout)
         self.setCentralWidget(container)
@@ -70,6 +138,12 @@ class ExifEraserApp(QMainWindow):
         # Status bar con Logo Arc-Team (come in Deeper Cleaner)
         self.statusBar = QStatusBar()
         self.setStatusBar(self.statusBar)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setTextVisible(False)
+        self.progress_bar.hide()
+        self.statusBar.addWidget(self.progress_bar)
+        self.progress_label = QLabel()
+        self.statusBar.addWidget(self.progress_label)
         status_widget = QWidget()
         status_layout = QHBoxLayout()
         status_layout.setContentsMargins(0, 0, 5, 0)
@@ -87,6 +161,8 @@ class ExifEraserApp(QMainWindow):
 
         self.input_dir = None
         self.output_dir = None
+        self.worker = None
+        self.start_time = None
 
     def open_input_dir_dialog(self):
         directory = QFileDialog.getExistingDirectory(self, "Seleziona Cartella Sorgente")
@@ -103,29 +179,81 @@ class ExifEraserApp(QMainWindow):
             self.check_ready()
 
     def check_ready(self):
-        if self.input_dir and self.output_dir:
-            self.button_run.setEnabled(True)
+        self.button_run.setEnabled(self.worker is None and bool(self.input_dir and self.output_dir))
 
     def process_images(self):
-        try:
-            files = [f for f in os.listdir(self.input_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-            if not files:
-                QMessageBox.warning(self, "Nessun File", "Nessuna immagine trovata nella cartella selezionata.")
-                return
-
-            count = 0
-            for filename in files:
-                in_path = os.path.join(self.input_dir, filename)
-                out_path = os.path.join(self.output_dir, filename)
-
-                img = Image.open(in_path)
-                # La magia: salvando senza passare l'argomento 'exif', i dati vengono eliminati
-                img.save(out_path, 'JPEG', optimize=True, quality=100)
-                count += 1
-
-            QMessageBox.information(self, "Completato", f"Processo terminato con successo!\nImmagini elaborate: {count}")
-        except Exception as e:
-            QMessageBox.critical(self, "Errore", f"Errore durante l'elaborazione: {str(e)}")
+        job = partial(process_folder, self.input_dir, self.output_dir, workers=self.spin_workers.value(),
+                      lossless=self.check_lossless.isChecked(), all_app=self.check_all_app.isChecked(),
+                      skip_unchanged=self.check_skip.isChecked(), hash_files=self.check_hash.isChecked(),
+                      index_path=os.path.join(self.output_dir, INDEX_NAME) if self.check_index.isChecked() else None,
+                      thumbnail_dir=os.path.join(self.output_dir, THUMBNAIL_DIR)
+                      if self.check_thumbnails.isChecked() else None)
+        self.worker = EraserWorker(job, self)
+        self.worker.progress.connect(self.update_progress)
+        self.worker.succeeded.connect(self.processing_succeeded)
+        self.worker.failed.connect(self.processing_failed)
+        self.worker.cancelled.connect(self.processing_cancelled)
+        self.worker.finished.connect(self.processing_finished)
+
+        self.start_time = time.monotonic()
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        self.progress_label.setText("Elaborazione...")
+        self.button_cancel.setEnabled(True)
+        self.check_ready()
+        self.worker.start()
+
+    def cancel_processing(self):
+        if self.worker is not None:
+            self.button_cancel.setEnabled(False)
+            self.progress_label.setText("Annullamento...")
+            self.worker.requestInterruption()
+
+    def update_progress(self, done, total, bytes_done):
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(done)
+        elapsed = time.monotonic() - self.start_time
+        if elapsed <= 0 or done <= 0:
+            return
+        eta = int((total - done) * elapsed / done)
+        self.progress_label.setText(
+            f"{done}/{total} immagini - {bytes_done / 1e6 / elapsed:.1f} MB/s - "
+            f"ETA {eta // 60}:{eta % 60:02d}")
+
+    def processing_succeeded(self, results):
+        if not results:
+            self.progress_label.setText("")
+            QMessageBox.warning(self, "Nessun File", "Nessuna immagine trovata nella cartella selezionata.")
+            return
+        failed = sum(1 for result in results if result["error"])
+        elapsed = time.monotonic() - self.start_time
+        self.progress_label.setText(f"{len(results)} immagini in {elapsed:.1f} s")
+        box = QMessageBox(QMessageBox.Warning if failed else QMessageBox.Information, "Completato",
+                          f"Processo terminato!\nImmagini elaborate: {len(results) - failed}"
+                          + (f"\nErrori: {failed}" if failed else ""), parent=self)
+        box.setDetailedText(format_summary(results))
+        box.exec_()
+
+    def processing_failed(self, message):
+        self.progress_label.setText("")
+        QMessageBox.critical(self, "Errore", f"Errore durante l'elaborazione: {message}")
+
+    def processing_cancelled(self):
+        self.progress_label.setText("Elaborazione annullata.")
+
+    def processing_finished(self):
+        self.worker.deleteLater()
+        self.worker = None
+        self.progress_bar.hide()
+        self.button_cancel.setEnabled(False)
+        self.check_ready()
+
+    def closeEvent(self, event):
+        # Interrompe un'eventuale elaborazione in corso prima di chiudere
+        if self.worker is not None:
+            self.worker.requestInterruption()
+            self.worker.wait()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
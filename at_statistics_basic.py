@@ -1,11 +1,30 @@
 import csv
-from collections import defaultdict
+import threading
+from functools import partial
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.figure import Figure
 from PIL import Image, ImageTk # Importa Pillow per la gestione delle immagini
 
+from at_statistics_basic_core import (CACHE_DIR, SPACE_SAVING_K, TOP_N, AnalysisCancelled, count_columns, crosstab,
+                                      crosstab_matrix, crosstab_rows, describe_numeric, top_values,
+                                      top_with_other)
+
+# Conteggi di tutte le colonne dell'ultimo file analizzato (ColumnCounts)
+analisi = None
+# Lettura in corso nel thread di lavoro (None se nessuna)
+lettura = None
+# Intervallo di controllo dell'avanzamento, in millisecondi
+INTERVALLO_CONTROLLO = 100
+# Voce del grafico che raccoglie i valori oltre i primi N
+ALTRI = "(altri)"
+# Barre del grafico attuale (None se non c'e' ancora un grafico)
+barre = None
+barre_categorie = False
+# Barra dei colori della mappa di calore (None se non mostrata)
+barra_colori = None
+
 def carica_file():
     """Apri una finestra per selezionare il file CSV e carica i nomi dei campi."""
     file_path = filedialog.askopenfilename(filetypes=[("File CSV", "*.csv")])
@@ -19,6 +38,8 @@ def carica_file():
                 reader = csv.reader(file)
                 header = next(reader)  # Leggi la prima riga (intestazione)
                 combo_campo["values"] = header
+                combo_incrocio["values"] = [""] + header
+                combo_incrocio.set("")
                 if "essere" in header:
                     combo_campo.current(header.index("essere"))  # Seleziona "essere" di default
                 else:
@@ -28,7 +49,7 @@ def carica_file():
 
 def salva_risultati():
     """Salva i risultati in un file CSV scelto dall'utente."""
-    if not hasattr(salva_risultati, "conteggi"):
+    if not hasattr(salva_risultati, "righe"):
         messagebox.showerror("Errore", "Nessun risultato da salvare. Esegui prima l'analisi!")
         return
 
@@ -39,9 +60,7 @@ def salva_risultati():
     if file_path:
         with open(file_path, mode="w", encoding="utf-8", newline="") as file:
             writer = csv.writer(file)
-            writer.writerow(["Valore", "Conteggio"])
-            for valore, count in sorted(salva_risultati.conteggi.items(), key=lambda x: x[1], reverse=True):
-                writer.writerow([valore, count])
+            writer.writerows(salva_risultati.righe())
         messagebox.showinfo("Successo", f"Risultati salvati in:\n{file_path}")
 
 def salva_grafico(fig):
@@ -59,7 +78,7 @@ def salva_grafico(fig):
         messagebox.showinfo("Successo", f"Grafico salvato in:\n{file_path}")
 
 def analizza_file():
-    """Legge il file CSV, conta i valori del campo selezionato e mostra il grafico."""
+    """Conta i valori (o calcola le statistiche numeriche) del campo selezionato e mostra il grafico."""
     file_csv = entry_file.get()
     if not file_csv:
         messagebox.showerror("Errore", "Seleziona prima un file CSV!")
@@ -70,137 +89,400 @@ def analizza_file():
         messagebox.showerror("Errore", "Seleziona un campo da analizzare!")
         return
 
+    campo_incrocio = combo_incrocio.get()
+    if campo_incrocio:
+        if campo_incrocio == campo_selezionato:
+            messagebox.showerror("Errore", "Scegli due campi diversi da incrociare!")
+            return
+        # Tabella di contingenza: il file viene diviso in parti contate in parallelo
+        if lettura is None:
+            avvia_lettura(partial(crosstab, file_csv, [campo_selezionato, campo_incrocio]), mostra_incrocio)
+    elif var_numerico.get():
+        # Una passata a blocchi sul solo campo scelto, a memoria limitata
+        if lettura is None:
+            avvia_lettura(partial(describe_numeric, file_csv, campo_selezionato), mostra_numerico)
+    elif var_frequenti.get():
+        # Campi con moltissimi valori distinti: solo i K piu' frequenti restano in memoria
+        if lettura is None:
+            k = max(SPACE_SAVING_K, 10 * valori_mostrati())
+            avvia_lettura(partial(top_values, file_csv, campo_selezionato, k=k), mostra_frequenti)
+    # Il file viene letto solo la prima volta (o se e' cambiato): tutte le
+    # colonne vengono contate insieme, cambiare campo e' immediato
+    elif analisi is not None and analisi.matches(file_csv):
+        mostra_risultati(campo_selezionato)
+    elif lettura is None:
+        avvia_lettura(partial(count_columns, file_csv, cache_dir=CACHE_DIR),
+                      partial(conteggi_letti, campo_selezionato=campo_selezionato))
+
+def valori_mostrati():
+    """Numero di valori da mostrare in testo e grafico (TOP_N se non valido)."""
+    try:
+        return max(int(spin_primi.get()), 1)
+    except ValueError:
+        return TOP_N
+
+def campo_cambiato(event):
+    """Con il file gia' letto, cambiare campo mostra subito i nuovi conteggi."""
+    if not (var_numerico.get() or var_frequenti.get() or combo_incrocio.get()) and analisi is not None and analisi.matches(entry_file.get()):
+        analizza_file()
+
+def avvia_lettura(lavoro, al_termine):
+    """Esegue ``lavoro`` in un thread, senza bloccare la finestra; poi chiama ``al_termine``.
+
+    ``lavoro`` riceve gli argomenti progress e should_cancel del motore,
+    ``al_termine`` il suo risultato (nel thread della GUI).
+    """
+    global lettura
+    corrente = {"al_termine": al_termine, "letti": 0, "totale": 0,
+                "risultato": None, "errore": None,
+                "annulla": threading.Event(), "finito": threading.Event()}
+
+    def esegui():
+        # Nessun widget Tk qui: il thread aggiorna solo il dizionario, letto da controlla_lettura
+        try:
+            corrente["risultato"] = lavoro(
+                progress=lambda letti, totale: corrente.update(letti=letti, totale=totale),
+                should_cancel=corrente["annulla"].is_set)
+        except AnalysisCancelled:
+            pass
+        except Exception as e:
+            corrente["errore"] = e
+        finally:
+            corrente["finito"].set()
+
+    lettura = corrente
+    button_analizza.config(state=tk.DISABLED)
+    button_annulla.config(state=tk.NORMAL)
+    progress_bar["value"] = 0
+    label_progresso.config(text="Lettura del file...")
+    threading.Thread(target=esegui, daemon=True).start()
+    root.after(INTERVALLO_CONTROLLO, controlla_lettura)
+
+def annulla_lettura():
+    """Interrompe la lettura in corso."""
+    if lettura is not None:
+        lettura["annulla"].set()
+        button_annulla.config(state=tk.DISABLED)
+        label_progresso.config(text="Annullamento...")
+
+def controlla_lettura():
+    """Aggiorna la barra di avanzamento e, a lettura finita, mostra i risultati."""
+    global lettura
+    if not lettura["finito"].is_set():
+        if lettura["totale"]:
+            progress_bar["value"] = 100 * lettura["letti"] / lettura["totale"]
+            label_progresso.config(text=f"{lettura['letti'] / 1e6:.1f} di {lettura['totale'] / 1e6:.1f} MB")
+        root.after(INTERVALLO_CONTROLLO, controlla_lettura)
+        return
+
+    corrente, lettura = lettura, None
+    button_analizza.config(state=tk.NORMAL)
+    button_annulla.config(state=tk.DISABLED)
+    progress_bar["value"] = 0
+    if corrente["errore"] is not None:
+        label_progresso.config(text="")
+        messagebox.showerror("Errore", f"Si è verificato un errore:\n{str(corrente['errore'])}")
+    elif corrente["risultato"] is None:
+        label_progresso.config(text="Analisi annullata.")
+    else:
+        corrente["al_termine"](corrente["risultato"])
+
+def conteggi_letti(risultato, campo_selezionato):
+    """Tiene i conteggi di tutte le colonne e mostra quelli del campo scelto."""
+    global analisi
+    analisi = risultato
+    label_progresso.config(text=f"{analisi.rows} righe lette")
+    mostra_risultati(campo_selezionato)
+
+def mostra_risultati(campo_selezionato):
+    """Mostra testo e grafico dei conteggi del campo, dal file gia' letto."""
     try:
-        conteggi = defaultdict(int)
-        with open(file_csv, mode="r", encoding="utf-8") as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                valore = row.get(campo_selezionato, "")
-                if valore:  # Ignora valori vuoti
-                    conteggi[valore] += 1
-
-        # Salva i conteggi per il salvataggio successivo
-        salva_risultati.conteggi = conteggi
-
-        # Stampa i risultati nella finestra
-        text_output.delete(1.0, tk.END)
-        text_output.insert(tk.END, f"Statistiche per il campo '{campo_selezionato}':\n")
-        for valore, count in sorted(conteggi.items(), key=lambda x: x[1], reverse=True):
-            text_output.insert(tk.END, f"{valore}: {count}\n")
+        if campo_selezionato not in analisi.columns:
+            messagebox.showerror("Errore", f"Il campo '{campo_selezionato}' non esiste nel file!")
+            return
+        conteggi = analisi.counts(campo_selezionato)
+
+        # L'elenco completo viene ordinato solo se si salvano i risultati
+        salva_risultati.righe = lambda: [["Valore", "Conteggio"]] + [
+            [valore, count] for valore, count in sorted(conteggi.items(), key=lambda x: x[1], reverse=True)]
+
+        # Testo e grafico solo per i primi N valori: i tempi non dipendono dai valori distinti
+        primi, altri = top_with_other(conteggi, sum(conteggi.values()), valori_mostrati())
+        testo = [f"Statistiche per il campo '{campo_selezionato}':"]
+        testo += [f"{valore}: {count}" for valore, count in primi]
+        if altri:
+            testo.append(f"Altri ({len(conteggi) - len(primi)} valori): {altri}")
+        scrivi_output(testo)
 
         # Mostra il grafico
-        mostra_grafico(conteggi, campo_selezionato)
+        mostra_grafico(primi + ([(ALTRI, altri)] if altri else []), campo_selezionato)
 
     except Exception as e:
         messagebox.showerror("Errore", f"Si è verificato un errore:\n{str(e)}")
 
-def mostra_grafico(conteggi, campo_selezionato):
-    """Mostra il grafico nel frame dedicato."""
-    global fig  # Rendi la figura globale per poterla salvare successivamente
-    valori, counts = zip(*sorted(conteggi.items(), key=lambda x: x[1], reverse=True))
+def mostra_frequenti(riepilogo):
+    """Mostra i valori piu' frequenti stimati con memoria limitata (Space-Saving)."""
+    campo_selezionato = riepilogo["field"]
+    label_progresso.config(text=f"{riepilogo['total']} valori letti")
+    salva_risultati.righe = lambda: [["Valore", "Conteggio stimato", "Errore massimo"]] + [
+        [valore, count, errore] for valore, count, errore in riepilogo["top"]]
+
+    primi, altri = top_with_other([(valore, count) for valore, count, _ in riepilogo["top"]],
+                                  riepilogo["total"], valori_mostrati())
+    testo = [f"Valori piu' frequenti per il campo '{campo_selezionato}' (stima):"]
+    testo += [f"{valore}: {count}" + (f" (errore massimo {errore})" if errore else "")
+              for valore, count, errore in riepilogo["top"][:len(primi)]]
+    if altri:
+        testo.append(f"Altri: {altri}")
+    scrivi_output(testo)
+
+    mostra_grafico(primi + ([(ALTRI, altri)] if altri else []), campo_selezionato)
+
+def mostra_grafico(voci, campo_selezionato):
+    """Mostra il grafico delle voci (valore, conteggio) nel frame dedicato."""
+    if not voci:
+        return
+    valori, counts = zip(*voci)
+    posizioni = [posizione - 0.4 for posizione in range(len(valori))]
+    disegna_barre(posizioni, counts, [0.8] * len(valori),
+                  f"Distribuzione dei valori per '{campo_selezionato}'", valori)
+
+def disegna_barre(x, altezze, larghezze, titolo, etichette=None):
+    """Disegna barre (dal bordo sinistro ``x``) sulla figura unica della finestra.
+
+    Figura e canvas vengono creati una volta sola: se il numero e il tipo di
+    barre non cambiano, i rettangoli esistenti vengono solo spostati e
+    ridimensionati, altrimenti gli assi vengono svuotati e ridisegnati.
+    Con ``etichette`` le barre sono categorie, senza sono classi numeriche.
+    """
+    global barre, barre_categorie, barra_colori
+    if barra_colori is not None:
+        barra_colori.remove()
+        barra_colori = None
+    if barre is not None and len(barre) == len(altezze) and barre_categorie == (etichette is not None):
+        for rettangolo, sinistra, altezza, larghezza in zip(barre, x, altezze, larghezze):
+            rettangolo.set_x(sinistra)
+            rettangolo.set_height(altezza)
+            rettangolo.set_width(larghezza)
+    else:
+        ax.clear()
+        barre = ax.bar(x, altezze, width=larghezze, align="edge",
+                       edgecolor=None if etichette is not None else "white")
+        barre_categorie = etichette is not None
+        ax.set_ylabel("Conteggio")
+    if etichette is not None:
+        ax.set_xticks(range(len(etichette)), etichette, rotation=45, ha="right")
+    ax.set_title(titolo)
+    ax.relim()
+    ax.autoscale_view()
+    if not canvas.get_tk_widget().winfo_ismapped():
+        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+    canvas.draw_idle()
+
+def scrivi_output(righe_testo):
+    """Sostituisce il testo dei risultati con un solo inserimento."""
+    text_output.delete(1.0, tk.END)
+    text_output.insert(tk.END, "\n".join(righe_testo) + "\n")
+
+def mostra_numerico(riepilogo):
+    """Mostra le statistiche descrittive e l'istogramma di un campo numerico."""
+    campo_selezionato = riepilogo["field"]
+    label_progresso.config(text=f"{riepilogo['count']} valori numerici")
+    righe = [["Statistica", "Valore"],
+             ["Valori numerici", riepilogo["count"]],
+             ["Valori non numerici (ignorati)", riepilogo["invalid"]],
+             ["Media", riepilogo["mean"]],
+             ["Varianza", riepilogo["variance"]],
+             ["Deviazione standard", riepilogo["variance"] ** 0.5],
+             ["Minimo", riepilogo["min"]],
+             ["Massimo", riepilogo["max"]]]
+    # Quantili approssimati (sketch a memoria limitata)
+    righe += [["Mediana (appross.)" if quantile == 0.5 else f"{quantile:.0%} quantile (appross.)", valore]
+              for quantile, valore in riepilogo["quantiles"].items()]
+    salva_risultati.righe = lambda: righe
+
+    scrivi_output([f"Statistiche numeriche per il campo '{campo_selezionato}':"]
+                  + [f"{nome}: {valore}" if isinstance(valore, int) else f"{nome}: {valore:.6g}"
+                     for nome, valore in righe[1:]])
+
+    if riepilogo["count"]:
+        counts, edges = riepilogo["histogram"]
+        disegna_barre(edges[:-1], counts, edges[1:] - edges[:-1], f"Istogramma di '{campo_selezionato}'")
+
+def mostra_incrocio(risultato):
+    """Mostra le combinazioni piu' frequenti di due campi e la mappa di calore della tabella."""
+    campo_righe, campo_colonne = risultato["fields"]
+    conteggi = risultato["counts"]
+    label_progresso.config(text=f"{risultato['rows']} righe lette")
+    etichette_righe, etichette_colonne, matrice = crosstab_matrix(conteggi)
+    # Si salva la tabella completa, con i totali
+    salva_risultati.righe = lambda: crosstab_rows(risultato["fields"], etichette_righe, etichette_colonne, matrice)
+
+    n = valori_mostrati()
+    primi, altri = top_with_other(conteggi, sum(conteggi.values()), n)
+    testo = [f"Tabella '{campo_righe}' x '{campo_colonne}': "
+             f"{len(etichette_righe)} x {len(etichette_colonne)} valori, {len(conteggi)} combinazioni"]
+    testo += [f"{riga} / {colonna}: {count}" for (riga, colonna), count in primi]
+    if altri:
+        testo.append(f"Altre ({len(conteggi) - len(primi)} combinazioni): {altri}")
+    scrivi_output(testo)
+
+    if not matrice:
+        return
+    # Nel grafico solo le N righe e colonne con il totale piu' alto
+    totali_righe = [sum(riga) for riga in matrice]
+    totali_colonne = [sum(colonna) for colonna in zip(*matrice)]
+    righe = sorted(range(len(matrice)), key=totali_righe.__getitem__, reverse=True)[:n]
+    colonne = sorted(range(len(etichette_colonne)), key=totali_colonne.__getitem__, reverse=True)[:n]
+    disegna_heatmap([[matrice[i][j] for j in colonne] for i in righe],
+                    [etichette_righe[i][0] for i in righe], [etichette_colonne[j] for j in colonne],
+                    f"'{campo_righe}' x '{campo_colonne}'")
+
+def disegna_heatmap(matrice, etichette_righe, etichette_colonne, titolo):
+    """Disegna la mappa di calore della matrice sulla figura unica della finestra."""
+    global barre, barra_colori
+    if barra_colori is not None:
+        barra_colori.remove()  # Prima di svuotare gli assi, che la barra ha ridimensionato
+    ax.clear()
+    barre = None
+    immagine = ax.imshow(matrice, aspect="auto", cmap="viridis")
+    barra_colori = fig.colorbar(immagine, ax=ax, label="Conteggio")
+    ax.set_xticks(range(len(etichette_colonne)), etichette_colonne, rotation=45, ha="right")
+    ax.set_yticks(range(len(etichette_righe)), etichette_righe)
+    ax.set_title(titolo)
+    if not canvas.get_tk_widget().winfo_ismapped():
+        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+    canvas.draw_idle()
 
-    fig, ax = plt.subplots(figsize=(8, 5))
-    ax.bar(valori, counts)
-    ax.set_title(f"Distribuzione dei valori per '{campo_selezionato}'")
-    ax.set_xticklabels(valori, rotation=45, ha="right")
-    ax.set_ylabel("Conteggio")
+# --- Creazione della GUI ---
+# Solo se eseguito direttamente: i processi del pool di crosstab importano
+# questo modulo e non devono aprire una nuova finestra
+if __name__ == "__main__":
+    root = tk.Tk()
+    root.title("Statistiche CSV - Analisi Campi")
 
-    # Cancella il grafico precedente (se esiste)
-    for widget in frame_grafico.winfo_children():
-        widget.destroy()
+    # --- Header con logo e nome software ---
+    frame_header = tk.Frame(root, padx=10, pady=10)
+    frame_header.pack(fill=tk.X)
 
-    # Integra il grafico nella GUI
+    # Carica e ridimensiona il logo "Statistics Basics"
+    try:
+        img_sb = Image.open("icons/statistics_basics_icon.png")
+        img_sb = img_sb.resize((130, 113), Image.LANCZOS) # Ridimensiona a 40x40 pixel
+        photo_sb = ImageTk.PhotoImage(img_sb)
+        label_sb_icon = tk.Label(frame_header, image=photo_sb)
+        label_sb_icon.image = photo_sb # Mantieni un riferimento per evitare che venga eliminato dal garbage collector
+        label_sb_icon.pack(side=tk.LEFT, padx=(0, 10))
+    except FileNotFoundError:
+        messagebox.showwarning("Avviso", "Impossibile trovare 'icons/statistics_basics_icon.png'. Assicurati che il file sia nella cartella corretta.")
+        photo_sb = None # Imposta a None se l'immagine non viene caricata
+
+    # Testo del titolo
+    frame_title_text = tk.Frame(frame_header)
+    frame_title_text.pack(side=tk.LEFT, anchor=tk.NW)
+    tk.Label(frame_title_text, text="Statistics Basics", font=("Helvetica", 16, "bold")).pack(anchor=tk.W)
+    tk.Label(frame_title_text, text="(Arc-Team Tools)", font=("Helvetica", 10)).pack(anchor=tk.W)
+
+
+    # Frame per il caricamento del file
+    frame_file = tk.Frame(root, padx=10, pady=10)
+    frame_file.pack(fill=tk.X)
+
+    tk.Label(frame_file, text="File CSV:").pack(side=tk.LEFT)
+    entry_file = tk.Entry(frame_file, width=50)
+    entry_file.pack(side=tk.LEFT, expand=True, fill=tk.X)
+    tk.Button(frame_file, text="Sfoglia...", command=carica_file).pack(side=tk.LEFT)
+
+    # Frame per la selezione del campo
+    frame_campo = tk.Frame(root, padx=10, pady=5)
+    frame_campo.pack(fill=tk.X)
+
+    tk.Label(frame_campo, text="Campo da analizzare:").pack(side=tk.LEFT)
+    combo_campo = ttk.Combobox(frame_campo, width=30)
+    combo_campo.pack(side=tk.LEFT, expand=True, fill=tk.X)
+    combo_campo.bind("<<ComboboxSelected>>", campo_cambiato)
+
+    # Modalita' numerica: media, varianza, quantili e istogramma invece dei conteggi
+    var_numerico = tk.BooleanVar(value=False)
+    tk.Checkbutton(frame_campo, text="Campo numerico", variable=var_numerico).pack(side=tk.LEFT, padx=(10, 0))
+
+    # Secondo campo facoltativo: tabella di contingenza con il campo da analizzare
+    tk.Label(frame_campo, text="Incrocia con:").pack(side=tk.LEFT, padx=(10, 0))
+    combo_incrocio = ttk.Combobox(frame_campo, width=20, state="readonly")
+    combo_incrocio.pack(side=tk.LEFT)
+
+    # Valori mostrati in testo e grafico; con "Solo i piu' frequenti" il campo viene
+    # letto con memoria limitata (Space-Saving), utile per codici e identificativi
+    frame_primi = tk.Frame(root, padx=10, pady=0)
+    frame_primi.pack(fill=tk.X)
+    tk.Label(frame_primi, text="Valori mostrati:").pack(side=tk.LEFT)
+    spin_primi = tk.Spinbox(frame_primi, from_=5, to=500, width=5)
+    spin_primi.delete(0, tk.END)
+    spin_primi.insert(0, TOP_N)
+    spin_primi.pack(side=tk.LEFT)
+    var_frequenti = tk.BooleanVar(value=False)
+    tk.Checkbutton(frame_primi, text="Solo i più frequenti (memoria limitata)",
+                   variable=var_frequenti).pack(side=tk.LEFT, padx=(10, 0))
+
+    # Pulsanti per avviare e annullare l'analisi, con l'avanzamento della lettura
+    frame_analisi = tk.Frame(root, padx=10, pady=5)
+    frame_analisi.pack(fill=tk.X)
+
+    button_analizza = tk.Button(frame_analisi, text="Analizza", command=analizza_file)
+    button_analizza.pack(side=tk.LEFT)
+    button_annulla = tk.Button(frame_analisi, text="Annulla", command=annulla_lettura, state=tk.DISABLED)
+    button_annulla.pack(side=tk.LEFT, padx=5)
+    progress_bar = ttk.Progressbar(frame_analisi, maximum=100)
+    progress_bar.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=5)
+    label_progresso = tk.Label(frame_analisi, width=24, anchor=tk.W)
+    label_progresso.pack(side=tk.LEFT)
+
+    # Frame per l'output testuale
+    frame_output = tk.Frame(root, padx=10, pady=10)
+    frame_output.pack(fill=tk.BOTH, expand=True)
+
+    text_output = tk.Text(frame_output, height=10)
+    text_output.pack(fill=tk.BOTH, expand=True)
+
+    # Frame per il grafico
+    frame_grafico = tk.Frame(root, padx=10, pady=10)
+    frame_grafico.pack(fill=tk.BOTH, expand=True)
+
+    # Figura e canvas unici, riusati da ogni analisi (disegna_barre). La figura
+    # non passa da pyplot, che altrimenti terrebbe in vita ogni figura creata
+    fig = Figure(figsize=(8, 5))
+    ax = fig.add_subplot()
     canvas = FigureCanvasTkAgg(fig, master=frame_grafico)
-    canvas.draw()
-    canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
 
-# --- Creazione della GUI ---
-root = tk.Tk()
-root.title("Statistiche CSV - Analisi Campi")
-
-# --- Header con logo e nome software ---
-frame_header = tk.Frame(root, padx=10, pady=10)
-frame_header.pack(fill=tk.X)
-
-# Carica e ridimensiona il logo "Statistics Basics"
-try:
-    img_sb = Image.open("icons/statistics_basics_icon.png")
-    img_sb = img_sb.resize((130, 113), Image.LANCZOS) # Ridimensiona a 40x40 pixel
-    photo_sb = ImageTk.PhotoImage(img_sb)
-    label_sb_icon = tk.Label(frame_header, image=photo_sb)
-    label_sb_icon.image = photo_sb # Mantieni un riferimento per evitare che venga eliminato dal garbage collector
-    label_sb_icon.pack(side=tk.LEFT, padx=(0, 10))
-except FileNotFoundError:
-    messagebox.showwarning("Avviso", "Impossibile trovare 'icons/statistics_basics_icon.png'. Assicurati che il file sia nella cartella corretta.")
-    photo_sb = None # Imposta a None se l'immagine non viene caricata
-
-# Testo del titolo
-frame_title_text = tk.Frame(frame_header)
-frame_title_text.pack(side=tk.LEFT, anchor=tk.NW)
-tk.Label(frame_title_text, text="Statistics Basics", font=("Helvetica", 16, "bold")).pack(anchor=tk.W)
-tk.Label(frame_title_text, text="(Arc-Team Tools)", font=("Helvetica", 10)).pack(anchor=tk.W)
-
-
-# Frame per il caricamento del file
-frame_file = tk.Frame(root, padx=10, pady=10)
-frame_file.pack(fill=tk.X)
-
-tk.Label(frame_file, text="File CSV:").pack(side=tk.LEFT)
-entry_file = tk.Entry(frame_file, width=50)
-entry_file.pack(side=tk.LEFT, expand=True, fill=tk.X)
-tk.Button(frame_file, text="Sfoglia...", command=carica_file).pack(side=tk.LEFT)
-
-# Frame per la selezione del campo
-frame_campo = tk.Frame(root, padx=10, pady=5)
-frame_campo.pack(fill=tk.X)
-
-tk.Label(frame_campo, text="Campo da analizzare:").pack(side=tk.LEFT)
-combo_campo = ttk.Combobox(frame_campo, width=30)
-combo_campo.pack(side=tk.LEFT, expand=True, fill=tk.X)
-
-# Pulsante per avviare l'analisi
-tk.Button(root, text="Analizza", command=analizza_file).pack(pady=5)
-
-# Frame per l'output testuale
-frame_output = tk.Frame(root, padx=10, pady=10)
-frame_output.pack(fill=tk.BOTH, expand=True)
-
-text_output = tk.Text(frame_output, height=10)
-text_output.pack(fill=tk.BOTH, expand=True)
-
-# Frame per il grafico
-frame_grafico = tk.Frame(root, padx=10, pady=10)
-frame_grafico.pack(fill=tk.BOTH, expand=True)
-
-# Frame per i pulsanti di salvataggio
-frame_salva = tk.Frame(root, padx=10, pady=5)
-frame_salva.pack(fill=tk.X)
-
-# Pulsante per salvare i risultati
-tk.Button(frame_salva, text="Salva Risultati", command=salva_risultati).pack(side=tk.LEFT, padx=5)
-
-# Pulsante per salvare il grafico
-tk.Button(frame_salva, text="Salva Grafico", command=lambda: salva_grafico(fig) if 'fig' in globals() else messagebox.showerror("Errore", "Nessun grafico da salvare. Esegui prima l'analisi!")).pack(side=tk.LEFT, padx=5)
-
-# --- Footer con "Powered by Arc-Team" e logo Arc-Team ---
-frame_footer = tk.Frame(root, padx=10, pady=5)
-frame_footer.pack(fill=tk.X, side=tk.BOTTOM)
-
-# Carica e ridimensiona il logo "Arc-Team" (questo va impacchettato prima)
-try:
-    img_arcteam = Image.open("icons/arc-team_logo.png")
-    img_arcteam = img_arcteam.resize((300, 70), Image.LANCZOS) # Ridimensiona a una dimensione adatta
-    photo_arcteam = ImageTk.PhotoImage(img_arcteam)
-    label_arcteam_icon = tk.Label(frame_footer, image=photo_arcteam)
-    label_arcteam_icon.image = photo_arcteam # Mantieni un riferimento
-    label_arcteam_icon.pack(side=tk.RIGHT) # Impacchetta a destra
-except FileNotFoundError:
-    messagebox.showwarning("Avviso", "Impossibile trovare 'icons/arc-team_logo.png'. Assicurati che il file sia nella cartella corretta.")
-    photo_arcteam = None # Imposta a None se l'immagine non viene caricata
-
-# Testo "Powered by Arc-Team" (questo va impacchettato dopo)
-tk.Label(frame_footer, text="Powered by Arc-Team", font=("Helvetica", 9)).pack(side=tk.RIGHT, padx=(10, 0)) # Impacchetta a destra
-
-
-# Avvia la GUI
-root.mainloop()
+    # Frame per i pulsanti di salvataggio
+    frame_salva = tk.Frame(root, padx=10, pady=5)
+    frame_salva.pack(fill=tk.X)
+
+    # Pulsante per salvare i risultati
+    tk.Button(frame_salva, text="Salva Risultati", command=salva_risultati).pack(side=tk.LEFT, padx=5)
+
+    # Pulsante per salvare il grafico
+    tk.Button(frame_salva, text="Salva Grafico", command=lambda: salva_grafico(fig) if ax.has_data() else messagebox.showerror("Errore", "Nessun grafico da salvare. Esegui prima l'analisi!")).pack(side=tk.LEFT, padx=5)
+
+    # --- Footer con "Powered by Arc-Team" e logo Arc-Team ---
+    frame_footer = tk.Frame(root, padx=10, pady=5)
+    frame_footer.pack(fill=tk.X, side=tk.BOTTOM)
+
+    # Carica e ridimensiona il logo "Arc-Team" (questo va impacchettato prima)
+    try:
+        img_arcteam = Image.open("icons/arc-team_logo.png")
+        img_arcteam = img_arcteam.resize((300, 70), Image.LANCZOS) # Ridimensiona a una dimensione adatta
+        photo_arcteam = ImageTk.PhotoImage(img_arcteam)
+        label_arcteam_icon = tk.Label(frame_footer, image=photo_arcteam)
+        label_arcteam_icon.image = photo_arcteam # Mantieni un riferimento
+        label_arcteam_icon.pack(side=tk.RIGHT) # Impacchetta a destra
+    except FileNotFoundError:
+        messagebox.showwarning("Avviso", "Impossibile trovare 'icons/arc-team_logo.png'. Assicurati che il file sia nella cartella corretta.")
+        photo_arcteam = None # Imposta a None se l'immagine non viene caricata
+
+    # Testo "Powered by Arc-Team" (questo va impacchettato dopo)
+    tk.Label(frame_footer, text="Powered by Arc-Team", font=("Helvetica", 9)).pack(side=tk.RIGHT, padx=(10, 0)) # Impacchetta a destra
+
+
+    # Avvia la GUI
+    root.mainloop()
@@ -0,0 +1,732 @@
+"""Motore di Statistics Basic, utilizzabile senza interfaccia grafica.
+
+Il CSV viene letto una sola volta con csv.reader: le righe vengono raccolte
+a blocchi e trasposte in colonne. Con NumPy ogni colonna viene codificata a
+dizionario (una tabella dei valori distinti e un array di codici interi, uno
+per riga) e i conteggi si ottengono con np.bincount; senza NumPy i valori
+vengono contati con Counter.update. I dati di tutte le colonne restano in
+memoria, cosi' cambiare il campo da analizzare non richiede una nuova lettura.
+I campi numerici possono essere riassunti (describe_numeric) con una
+passata a blocchi e memoria limitata, anche per file piu' grandi della RAM.
+
+Le colonne codificate possono essere salvate in una cache su disco (codici
+in un .npy, letto con mmap, e tabelle dei valori in un .json), valida finche'
+percorso, dimensione e data di modifica del CSV non cambiano: riaprire un
+file gia' analizzato non richiede di rileggerlo.
+
+Le tabelle di contingenza di due o piu' campi (crosstab) dividono il file in
+intervalli di byte allineati ai record, contati in parallelo da un pool di
+processi; anche da riga di comando:
+
+    python at_statistics_basic_core.py reperti.csv materiale us -o materiale_us.csv
+"""
+import argparse
+import contextlib
+import csv
+import hashlib
+import heapq
+import io
+import json
+import math
+import mmap
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice, zip_longest
+from operator import itemgetter
+
+try:
+    import numpy as np
+except ImportError:  # senza NumPy niente codifica a dizionario ne' cache
+    np = None
+
+# Righe lette e trasposte per ogni blocco
+BLOCK_ROWS = 50000
+# Cache delle colonne codificate: cartella predefinita e dimensione massima
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                         "arc-team-tools", "statistics_basic")
+CACHE_SIZE_LIMIT = 1024 ** 3
+CACHE_VERSION = 1
+# Modalita' numerica: classi massime dell'istogramma, valori per livello dello
+# sketch dei quantili e quantili calcolati
+HISTOGRAM_BINS = 40
+SKETCH_CAPACITY = 4096
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+# Valori tenuti dallo Space-Saving e valori mostrati in testo e grafico
+# (gli altri finiscono in un'unica voce)
+SPACE_SAVING_K = 1000
+TOP_N = 30
+# Tabelle di contingenza: bytes per ogni compito inviato al pool di processi
+CHUNK_BYTES = 32 * 1024 * 1024
+
+
+class ColumnCounts:
+    """Valori di ogni colonna di un CSV: conteggi o colonne codificate.
+
+    Con ``codes`` (array colonne x righe di codici interi) e ``values``
+    (per ogni colonna la tabella dei valori, con il codice 0 riservato al
+    valore vuoto) i conteggi di un campo vengono calcolati alla prima
+    richiesta; altrimenti ``counters`` contiene gia' un Counter per colonna.
+    ``size`` e ``mtime_ns`` identificano la versione del file letta: con
+    ``matches`` si verifica se i dati valgono ancora.
+    """
+
+    def __init__(self, path, size, mtime_ns, header, rows, counters=None, codes=None, values=None):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.header = header
+        self.rows = rows
+        self.counters = counters if counters is not None else [None] * len(header)
+        self.codes = codes
+        self.values = values
+        # Con nomi ripetuti vale l'ultima colonna, come con csv.DictReader
+        self.columns = {name: index for index, name in enumerate(header)}
+
+    def matches(self, path):
+        """True se ``path`` e' lo stesso file, non modificato dalla lettura."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return (os.path.abspath(path) == os.path.abspath(self.path) and stat.st_size == self.size
+                and stat.st_mtime_ns == self.mtime_ns)
+
+    def counts(self, field):
+        """Counter dei valori non vuoti del campo ``field``."""
+        index = self.columns[field]
+        if self.counters[index] is None:
+            values = self.values[index]
+            totals = np.bincount(self.codes[index], minlength=len(values))
+            self.counters[index] = Counter(
+                {values[code]: int(totals[code]) for code in np.flatnonzero(totals[1:]) + 1})
+        return self.counters[index]
+
+
+class _CodeTable(dict):
+    """Valore -> codice, con un nuovo codice per ogni valore mai visto."""
+
+    def __missing__(self, value):
+        code = self[value] = len(self)
+        return code
+
+
+def _cache_paths(path, cache_dir):
+    """File .json (intestazione e valori) e .npy (codici) della cache di ``path``."""
+    key = hashlib.sha1(os.path.abspath(path).encode("utf-8", "surrogatepass")).hexdigest()
+    base = os.path.join(cache_dir, key)
+    return base + ".json", base + ".npy"
+
+
+def load_cache(path, cache_dir=CACHE_DIR, encoding="utf-8"):
+    """ColumnCounts di ``path`` dalla cache, None se assente o non piu' valida.
+
+    I codici vengono aperti con mmap: vengono letti dal disco solo quando
+    servono i conteggi di una colonna.
+    """
+    if np is None:
+        return None
+    meta_path, codes_path = _cache_paths(path, cache_dir)
+    try:
+        stat = os.stat(path)
+        with open(meta_path, encoding="utf-8") as file:
+            meta = json.load(file)
+        if (meta["version"] != CACHE_VERSION or meta["path"] != os.path.abspath(path)
+                or meta["size"] != stat.st_size or meta["mtime_ns"] != stat.st_mtime_ns
+                or meta["encoding"] != encoding):
+            return None
+        codes = np.load(codes_path, mmap_mode="r")
+        if codes.shape != (len(meta["header"]), meta["rows"]):
+            return None
+        os.utime(meta_path)  # Ordine LRU: la data di modifica e' quella dell'ultimo uso
+    except (OSError, ValueError, KeyError):
+        return None
+    return ColumnCounts(path, meta["size"], meta["mtime_ns"], meta["header"], meta["rows"],
+                        codes=codes, values=meta["values"])
+
+
+@contextlib.contextmanager
+def _atomic_path(path):
+    """Restituisce un percorso temporaneo che alla fine del blocco sostituisce ``path``.
+
+    Se il blocco fallisce il file temporaneo viene rimosso e ``path`` resta
+    com'era.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save_cache(counts, cache_dir=CACHE_DIR, encoding="utf-8", limit=CACHE_SIZE_LIMIT):
+    """Salva in cache le colonne codificate di ``counts`` e applica il limite ``limit``.
+
+    Le voci usate meno di recente vengono eliminate finche' la cache non
+    supera ``limit`` bytes. Il .json viene scritto per ultimo: una voce
+    senza .json (scrittura interrotta) non viene mai letta.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path, codes_path = _cache_paths(counts.path, cache_dir)
+    meta = {"version": CACHE_VERSION, "path": os.path.abspath(counts.path), "size": counts.size,
+            "mtime_ns": counts.mtime_ns, "encoding": encoding, "header": counts.header,
+            "rows": counts.rows, "values": counts.values}
+    for final_path, write in ((codes_path, lambda file: np.save(file, counts.codes)),
+                              (meta_path, lambda file: file.write(json.dumps(meta).encode("utf-8")))):
+        with _atomic_path(final_path) as tmp_path, open(tmp_path, "wb") as file:
+            write(file)
+    evict_cache(cache_dir, limit, keep=meta_path)
+
+
+def evict_cache(cache_dir=CACHE_DIR, limit=CACHE_SIZE_LIMIT, keep=None):
+    """Elimina le voci usate meno di recente finche' la cache supera ``limit`` bytes."""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if not entry.name.endswith(".json"):
+            continue
+        codes_path = entry.path[:-len(".json")] + ".npy"
+        size = entry.stat().st_size + (os.path.getsize(codes_path) if os.path.exists(codes_path) else 0)
+        entries.append((entry.stat().st_mtime_ns, size, entry.path, codes_path))
+    total = sum(size for _, size, _, _ in entries)
+    for _, size, meta_path, codes_path in sorted(entries):
+        if total <= limit:
+            break
+        if meta_path == keep:
+            continue
+        for path in (meta_path, codes_path):
+            if os.path.exists(path):
+                os.remove(path)
+        total -= size
+
+
+def read_header(path, encoding="utf-8"):
+    """Nomi dei campi (prima riga) del CSV."""
+    with open(path, encoding=encoding, newline="") as file:
+        return next(csv.reader(file), [])
+
+
+class AnalysisCancelled(Exception):
+    """Sollevata quando la lettura viene interrotta dall'utente."""
+
+
+def count_columns(path, encoding="utf-8", block_rows=BLOCK_ROWS, progress=None, should_cancel=None,
+                  cache_dir=None, cache_limit=CACHE_SIZE_LIMIT):
+    """Conta in una sola passata i valori di tutte le colonne di ``path``.
+
+    I valori vuoti vengono ignorati; le righe piu' corte dell'intestazione
+    contano solo i campi presenti, i campi in piu' vengono scartati (come
+    farebbe csv.DictReader). ``progress`` riceve (bytes letti, bytes totali)
+    dopo ogni blocco di ``block_rows`` righe; se ``should_cancel``
+    restituisce True si solleva AnalysisCancelled. Con ``cache_dir`` (e
+    NumPy) le colonne codificate vengono prese dalla cache o, dopo la
+    lettura, salvate in cache (save_cache). Restituisce un ColumnCounts.
+    """
+    if cache_dir:
+        cached = load_cache(path, cache_dir, encoding)
+        if cached is not None:
+            return cached
+    stat = os.stat(path)
+    with open(path, encoding=encoding, newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader, [])
+        if np is not None:
+            tables = [_CodeTable({"": 0}) for _ in header]
+            blocks = [[] for _ in header]
+        else:
+            counters = [Counter() for _ in header]
+        rows = 0
+        while True:
+            if should_cancel and should_cancel():
+                raise AnalysisCancelled()
+            block = list(islice(reader, block_rows))
+            if progress:
+                # Posizione nel file binario sottostante: esatta a meno del buffer
+                progress(file.buffer.tell(), stat.st_size)
+            if not block:
+                break
+            block = [row for row in block if row]  # Righe vuote: saltate come da DictReader
+            rows += len(block)
+            # Le colonne oltre l'intestazione restano fuori dallo zip
+            columns = zip_longest(*block, fillvalue="")
+            if np is None:
+                for counter, column in zip(counters, columns):
+                    counter.update(column)
+                continue
+            filled = 0
+            for index, column in zip(range(len(header)), columns):
+                # map e fromiter girano in C; solo i valori nuovi passano da __missing__
+                blocks[index].append(np.fromiter(map(tables[index].__getitem__, column),
+                                                  dtype=np.int32, count=len(column)))
+                filled = index + 1
+            # Righe del blocco tutte piu' corte dell'intestazione: colonne finali vuote
+            for index in range(filled, len(header)):
+                blocks[index].append(np.zeros(len(block), dtype=np.int32))
+    if np is None:
+        for counter in counters:
+            counter.pop("", None)
+        return ColumnCounts(path, stat.st_size, stat.st_mtime_ns, header, rows, counters=counters)
+    codes = np.zeros((len(header), rows), dtype=np.int32)
+    for index, column_blocks in enumerate(blocks):
+        if column_blocks:
+            codes[index, :] = np.concatenate(column_blocks)
+        column_blocks.clear()
+    result = ColumnCounts(path, stat.st_size, stat.st_mtime_ns, header, rows, codes=codes,
+                          values=[list(table) for table in tables])
+    if cache_dir:
+        try:
+            save_cache(result, cache_dir, encoding, cache_limit)
+        except OSError:
+            pass  # La cache serve solo a velocizzare: senza si rilegge il CSV
+    return result
+
+
+def column_blocks(path, field, encoding="utf-8", block_rows=BLOCK_ROWS, progress=None, should_cancel=None):
+    """Valori non vuoti del campo ``field``, un elenco per ogni blocco di ``block_rows`` righe.
+
+    Legge solo la colonna indicata (con nomi ripetuti vale l'ultima, come
+    con csv.DictReader); ``progress`` e ``should_cancel`` come in
+    count_columns.
+    """
+    stat = os.stat(path)
+    with open(path, encoding=encoding, newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader, [])
+        index = {name: position for position, name in enumerate(header)}.get(field)
+        if index is None:
+            raise ValueError(f"Field '{field}' not found in {path}.")
+        while True:
+            if should_cancel and should_cancel():
+                raise AnalysisCancelled()
+            block = list(islice(reader, block_rows))
+            if progress:
+                progress(file.buffer.tell(), stat.st_size)
+            if not block:
+                break
+            yield [row[index] for row in block if len(row) > index and row[index]]
+
+
+class StreamingHistogram:
+    """Istogramma a una passata con al massimo ``bins`` classi.
+
+    Le classi hanno ampiezza ``width`` (potenza di 2) e sono allineate ai
+    suoi multipli: quando i valori non ci stanno piu', l'ampiezza raddoppia
+    e le classi vengono unite a coppie, senza perdere conteggi.
+    """
+
+    def __init__(self, bins=HISTOGRAM_BINS):
+        self.bins = bins
+        self.width = None
+        self.first = 0  # indice (valore // width) della prima classe
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def add(self, values):
+        if not len(values):
+            return
+        low, high = values.min(), values.max()
+        if self.width is None:
+            span = (high - low) / self.bins
+            self.width = 2.0 ** math.ceil(math.log2(span)) if span > 0 else 1.0
+            self.first = math.floor(low / self.width)
+        while True:
+            first = min(self.first, math.floor(low / self.width))
+            last = max(self.first + len(self.counts) - 1, math.floor(high / self.width))
+            if last - first < self.bins:
+                break
+            # Classi a coppie allineate: l'indice dimezza, i conteggi si sommano
+            merged = np.zeros((self.first + len(self.counts) - 1) // 2 - self.first // 2 + 1, dtype=np.int64)
+            np.add.at(merged, (np.arange(len(self.counts)) + self.first) // 2 - self.first // 2, self.counts)
+            self.first //= 2
+            self.counts = merged
+            self.width *= 2
+        if first < self.first or last >= self.first + len(self.counts):
+            grown = np.zeros(last - first + 1, dtype=np.int64)
+            grown[self.first - first:self.first - first + len(self.counts)] = self.counts
+            self.first, self.counts = first, grown
+        indexes = np.floor(values / self.width).astype(np.int64) - self.first
+        self.counts += np.bincount(indexes, minlength=len(self.counts))
+
+    def result(self):
+        """(conteggi, limiti delle classi), come np.histogram."""
+        if self.width is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(1)
+        nonzero = np.flatnonzero(self.counts)
+        counts = self.counts[nonzero[0]:nonzero[-1] + 1]
+        first = self.first + nonzero[0]
+        return counts, (first + np.arange(len(counts) + 1)) * self.width
+
+
+class QuantileSketch:
+    """Quantili approssimati con memoria limitata (compattatori come in KLL).
+
+    Ogni livello tiene al massimo ``capacity`` valori; quando ne ha di
+    piu' vengono ordinati e ne passa al livello successivo uno su due (da
+    una posizione iniziale casuale), con peso doppio. L'errore sul rango
+    resta dell'ordine di log2(n / capacity) / capacity; fino a ``capacity``
+    valori i quantili sono esatti.
+    """
+
+    def __init__(self, capacity=SKETCH_CAPACITY, seed=0):
+        self.capacity = capacity
+        self.levels = [np.zeros(0)]
+        self.random = np.random.default_rng(seed)
+
+    def add(self, values):
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        level = 0
+        while len(self.levels[level]) > self.capacity:
+            items = np.sort(self.levels[level])
+            keep = len(items) % 2
+            if level + 1 == len(self.levels):
+                self.levels.append(np.zeros(0))
+            self.levels[level + 1] = np.concatenate(
+                [self.levels[level + 1], items[keep + self.random.integers(2)::2]])
+            self.levels[level] = items[:keep]
+            level += 1
+
+    def quantiles(self, fractions):
+        """Valori ai ranghi ``fractions`` (tra 0 e 1), NaN se non ci sono dati."""
+        items = np.concatenate(self.levels)
+        if not len(items):
+            return [math.nan for _ in fractions]
+        weights = np.concatenate([np.full(len(level), 2.0 ** index) for index, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, np.asarray(fractions) * cumulative[-1], side="left")
+        return [float(items[order][min(position, len(items) - 1)]) for position in positions]
+
+
+def _to_float(value):
+    """Valore numerico di ``value``, anche con la virgola decimale; NaN se non numerico."""
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return float(value.replace(",", "."))
+        except ValueError:
+            return math.nan
+
+
+def describe_numeric(path, field, encoding="utf-8", block_rows=BLOCK_ROWS, progress=None,
+                     should_cancel=None, bins=HISTOGRAM_BINS, quantiles=QUANTILES):
+    """Statistiche descrittive del campo numerico ``field``, in una sola passata.
+
+    Il file viene letto a blocchi di ``block_rows`` righe; ogni blocco
+    diventa un array NumPy da cui si aggiornano conteggio, media e varianza
+    (combinando i blocchi come Chan et al.), minimo e massimo, un
+    istogramma (StreamingHistogram) e i quantili ``quantiles``
+    (QuantileSketch, approssimati): la memoria usata non dipende dalla
+    dimensione del file. I valori vuoti vengono ignorati, quelli non
+    numerici contati in ``invalid``. ``progress`` e ``should_cancel`` come
+    in count_columns. Restituisce un dizionario.
+    """
+    if np is None:
+        raise RuntimeError("Numeric statistics require NumPy.")
+    count, mean, m2 = 0, 0.0, 0.0
+    minimum, maximum = math.inf, -math.inf
+    invalid = 0
+    histogram = StreamingHistogram(bins)
+    sketch = QuantileSketch()
+    for column in column_blocks(path, field, encoding, block_rows, progress, should_cancel):
+        try:
+            values = np.array(column, dtype=np.float64)
+        except ValueError:  # valori non numerici o con la virgola: uno per uno
+            values = np.fromiter(map(_to_float, column), dtype=np.float64, count=len(column))
+        finite = np.isfinite(values)
+        invalid += len(values) - int(finite.sum())
+        values = values[finite]
+        if not len(values):
+            continue
+        block_mean = values.mean()
+        block_m2 = ((values - block_mean) ** 2).sum()
+        total = count + len(values)
+        delta = block_mean - mean
+        mean += delta * len(values) / total
+        m2 += block_m2 + delta ** 2 * count * len(values) / total
+        count = total
+        minimum = min(minimum, values.min())
+        maximum = max(maximum, values.max())
+        histogram.add(values)
+        sketch.add(values)
+    counts, edges = histogram.result()
+    return {
+        "field": field,
+        "count": count,
+        "invalid": invalid,
+        "mean": float(mean) if count else math.nan,
+        "variance": float(m2 / (count - 1)) if count > 1 else math.nan,
+        "min": float(minimum) if count else math.nan,
+        "max": float(maximum) if count else math.nan,
+        "quantiles": dict(zip(quantiles, sketch.quantiles(quantiles))),
+        "histogram": (counts, edges),
+    }
+
+
+class SpaceSaving:
+    """Valori piu' frequenti con memoria limitata (Space-Saving a blocchi).
+
+    Tiene al massimo ``k`` valori con un conteggio stimato per eccesso ed
+    errore massimo: il conteggio vero sta tra conteggio - errore e
+    conteggio. Ogni blocco viene prima contato esattamente (Counter); un
+    valore nuovo parte da ``floor``, il conteggio piu' alto mai scartato,
+    che limita anche il conteggio di ogni valore non tenuto. I valori
+    entrati prima di ogni scarto hanno conteggi esatti (errore 0).
+    """
+
+    def __init__(self, k=SPACE_SAVING_K):
+        self.k = k
+        self.counts = {}
+        self.errors = {}
+        self.floor = 0
+        self.total = 0
+
+    def update(self, values):
+        block = Counter(values)
+        self.total += sum(block.values())
+        counts, errors, floor = self.counts, self.errors, self.floor
+        for value, count in block.items():
+            if value in counts:
+                counts[value] += count
+            else:
+                counts[value] = count + floor
+                errors[value] = floor
+        if len(counts) > self.k:
+            largest = heapq.nlargest(self.k + 1, counts.items(), key=itemgetter(1))
+            # Il (k+1)-esimo e' il piu' alto tra quelli scartati
+            self.floor = max(floor, largest.pop()[1])
+            kept = self.counts = dict(largest)
+            self.errors = {value: errors[value] for value in kept}
+
+    def top(self, n=None):
+        """(valore, conteggio stimato, errore massimo) dei ``n`` valori piu' frequenti."""
+        items = heapq.nlargest(n or len(self.counts), self.counts.items(), key=itemgetter(1))
+        return [(value, count, self.errors[value]) for value, count in items]
+
+
+def top_values(path, field, k=SPACE_SAVING_K, encoding="utf-8", block_rows=BLOCK_ROWS, progress=None,
+               should_cancel=None):
+    """Valori piu' frequenti del campo ``field`` con memoria limitata (SpaceSaving).
+
+    Adatto a campi con moltissimi valori distinti (codici, identificativi):
+    la memoria dipende da ``k`` e dal blocco, non dal numero di valori.
+    Restituisce un dizionario con il totale dei valori non vuoti e i ``k``
+    valori tenuti, dal piu' frequente.
+    """
+    summary = SpaceSaving(k)
+    for column in column_blocks(path, field, encoding, block_rows, progress, should_cancel):
+        summary.update(column)
+    return {"field": field, "total": summary.total, "top": summary.top(), "floor": summary.floor}
+
+
+def top_with_other(pairs, total, n=TOP_N):
+    """Primi ``n`` (valore, conteggio) di ``pairs`` e conteggio di tutti gli altri.
+
+    ``pairs`` e' gia' ordinato dal piu' frequente, o e' un Counter (da cui
+    si prendono i primi ``n`` senza ordinare tutti i valori).
+    """
+    top = pairs.most_common(n) if isinstance(pairs, Counter) else list(pairs[:n])
+    return top, max(total - sum(count for _, count in top), 0)
+
+
+def _record_end(data, position, quotes):
+    """Fine (esclusa) del primo record CSV che termina dopo ``position``.
+
+    ``quotes`` e' il numero di virgolette tra l'inizio del blocco e
+    ``position``: un a capo conta solo se le virgolette prima sono in numero
+    pari, cioe' se non e' dentro un campo tra virgolette. Restituisce (fine,
+    virgolette fino alla fine).
+    """
+    while True:
+        newline = data.find(b"\n", position)
+        if newline == -1:
+            return len(data), quotes + data[position:].count(b'"')
+        quotes += data[position:newline].count(b'"')
+        position = newline + 1
+        if quotes % 2 == 0:
+            return position, quotes
+
+
+def line_chunks(path, chunk_size=CHUNK_BYTES):
+    """Intestazione e intervalli di byte (inizio, fine) dei record di ``path``.
+
+    Gli intervalli sono lunghi circa ``chunk_size`` e tagliati a fine riga,
+    mai dentro un campo tra virgolette (anche su piu' righe): ogni
+    intervallo puo' essere letto da solo con csv.reader. Serve una codifica
+    compatibile con ASCII (UTF-8, Latin-1...). Restituisce (bytes
+    dell'intestazione, intervalli).
+    """
+    size = os.path.getsize(path)
+    if not size:
+        return b"", []
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        start, _ = _record_end(data, 0, 0)
+        header = data[:start]
+        chunks = []
+        while start < size:
+            target = start + chunk_size
+            if target >= size:
+                chunks.append((start, size))
+                break
+            # Solo le virgolette contano: quelle raddoppiate ("") non cambiano la parita'
+            end, _ = _record_end(data, target, data[start:target].count(b'"'))
+            chunks.append((start, end))
+            start = end
+    return header, chunks
+
+
+def _crosstab_chunk(path, start, end, indexes, encoding="utf-8"):
+    """Conteggi delle combinazioni dei campi ``indexes`` nei record tra ``start`` e ``end``.
+
+    Eseguita nei processi del pool: deve restare a livello di modulo.
+    """
+    with open(path, "rb") as file:
+        file.seek(start)
+        text = file.read(end - start).decode(encoding)
+    reader = csv.reader(io.StringIO(text, newline=""))
+    getter = itemgetter(*indexes)
+    width = max(indexes) + 1
+    counts = Counter()
+    rows = 0
+    while True:
+        block = list(islice(reader, BLOCK_ROWS))
+        if not block:
+            break
+        block = [row for row in block if row]  # Righe vuote: saltate come da DictReader
+        rows += len(block)
+        if block and min(map(len, block)) < width:
+            # Righe piu' corte: i campi mancanti sono vuoti
+            block = [row if len(row) >= width else row + [""] * (width - len(row)) for row in block]
+        counts.update(map(getter, block))  # Aggregazione su tabella hash, in C
+    return counts, rows, end - start
+
+
+def crosstab(path, fields, encoding="utf-8", workers=None, chunk_size=CHUNK_BYTES, progress=None,
+             should_cancel=None):
+    """Tabella di contingenza dei campi ``fields`` (due o piu'), in parallelo.
+
+    Il file viene diviso in intervalli di circa ``chunk_size`` bytes
+    allineati ai record (line_chunks), contati da ``workers`` processi (di
+    default uno per core; con 1, o con un solo intervallo, nel processo
+    corrente) e uniti. Le righe con uno dei campi vuoto vengono ignorate,
+    come nei conteggi di un campo. ``progress`` riceve (bytes letti, bytes
+    totali) dopo ogni intervallo; se ``should_cancel`` restituisce True gli
+    intervalli non ancora iniziati vengono annullati e si solleva
+    AnalysisCancelled. Restituisce un dizionario con i campi, il Counter
+    delle combinazioni (tuple di valori) e le righe lette.
+    """
+    if len(fields) < 2:
+        raise ValueError("Cross-tabulation needs at least two fields.")
+    header_bytes, chunks = line_chunks(path, chunk_size)
+    header = next(csv.reader(io.StringIO(header_bytes.decode(encoding), newline="")), [])
+    # Con nomi ripetuti vale l'ultima colonna, come con csv.DictReader
+    columns = {name: index for index, name in enumerate(header)}
+    missing = [field for field in fields if field not in columns]
+    if missing:
+        raise ValueError(f"Fields not found in {path}: {', '.join(missing)}.")
+    indexes = [columns[field] for field in fields]
+    total_bytes = os.path.getsize(path)
+    counts = Counter()
+    rows = 0
+    bytes_done = len(header_bytes)
+
+    def collect(result):
+        nonlocal rows, bytes_done
+        chunk_counts, chunk_rows, chunk_bytes = result
+        counts.update(chunk_counts)
+        rows += chunk_rows
+        bytes_done += chunk_bytes
+        if progress:
+            progress(bytes_done, total_bytes)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) <= 1:
+        for start, end in chunks:
+            if should_cancel and should_cancel():
+                raise AnalysisCancelled()
+            collect(_crosstab_chunk(path, start, end, indexes, encoding))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            futures = [pool.submit(_crosstab_chunk, path, start, end, indexes, encoding)
+                       for start, end in chunks]
+            for future in as_completed(futures):
+                collect(future.result())
+                if should_cancel and should_cancel():
+                    pool.shutdown(cancel_futures=True)
+                    raise AnalysisCancelled()
+    for key in [key for key in counts if "" in key]:
+        del counts[key]
+    return {"fields": list(fields), "counts": counts, "rows": rows}
+
+
+def crosstab_matrix(counts):
+    """Matrice dei conteggi: righe = valori dei primi campi, colonne = valori dell'ultimo.
+
+    Restituisce (etichette delle righe, etichette delle colonne, matrice
+    come lista di liste), con le etichette in ordine alfabetico.
+    """
+    row_labels = sorted({key[:-1] for key in counts})
+    column_labels = sorted({key[-1] for key in counts})
+    row_index = {label: index for index, label in enumerate(row_labels)}
+    column_index = {label: index for index, label in enumerate(column_labels)}
+    matrix = [[0] * len(column_labels) for _ in row_labels]
+    for key, count in counts.items():
+        matrix[row_index[key[:-1]]][column_index[key[-1]]] = count
+    return row_labels, column_labels, matrix
+
+
+def crosstab_rows(fields, row_labels, column_labels, matrix):
+    """Righe CSV della matrice, con totali di riga e di colonna."""
+    rows = [list(fields[:-1]) + list(column_labels) + ["Totale"]]
+    for label, counts in zip(row_labels, matrix):
+        rows.append(list(label) + counts + [sum(counts)])
+    totals = [sum(column) for column in zip(*matrix)] if matrix else [0] * len(column_labels)
+    rows.append(["Totale"] + [""] * (len(fields) - 2) + totals + [sum(totals)])
+    return rows
+
+
+def write_crosstab_csv(path, rows):
+    """Scrive le righe di crosstab_rows in ``path`` (file temporaneo e poi rinomina)."""
+    with _atomic_path(path) as tmp_path, open(tmp_path, "w", encoding="utf-8", newline="") as file:
+        csv.writer(file).writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Cross-tabulate fields of a large CSV file in parallel (Arc-Team Tools Statistics Basic).")
+    parser.add_argument("input", help="input CSV file")
+    parser.add_argument("fields", nargs="+", metavar="FIELD",
+                        help="two or more fields; the last one becomes the matrix columns")
+    parser.add_argument("-o", "--output", required=True, help="output matrix CSV")
+    parser.add_argument("--workers", type=int, metavar="N", help="number of worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_BYTES, metavar="BYTES",
+                        help=f"bytes per parallel task (default: {CHUNK_BYTES})")
+    parser.add_argument("--encoding", default="utf-8", help="file encoding, ASCII-compatible (default: utf-8)")
+    args = parser.parse_args(argv)
+    if len(args.fields) < 2:
+        parser.error("at least two fields are needed")
+
+    start = time.perf_counter()
+    try:
+        result = crosstab(args.input, args.fields, args.encoding, args.workers, args.chunk_size,
+                          progress=lambda done, total: print(
+                              f"\r{done / max(total, 1):.0%} of {total / 1e6:.1f} MB", end="", file=sys.stderr))
+        print(file=sys.stderr)
+        row_labels, column_labels, matrix = crosstab_matrix(result["counts"])
+        write_crosstab_csv(args.output, crosstab_rows(args.fields, row_labels, column_labels, matrix))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print("Cancelled.", file=sys.stderr)
+        return 130
+    print(f"{result['rows']} rows, {len(row_labels)} x {len(column_labels)} matrix, "
+          f"{time.perf_counter() - start:.2f} s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())